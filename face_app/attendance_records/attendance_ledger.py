@@ -0,0 +1,201 @@
+"""Append-only SQLite ledger of attendance events.
+
+Every recognition (and every manual mark) becomes one row with its
+session, timestamp and match distance. Writers only enqueue; a background
+thread commits the queue in batches. Reports are computed from the ledger
+when asked for and streamed, instead of rewriting a spreadsheet per session.
+"""
+import csv
+import datetime
+import io
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS attendance_events (
+    id INTEGER PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    status TEXT NOT NULL CHECK (status IN ('P', 'A')),
+    recorded_at REAL NOT NULL,
+    day TEXT NOT NULL,
+    distance REAL,
+    source TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_attendance_day_name ON attendance_events (day, name, recorded_at);
+CREATE INDEX IF NOT EXISTS idx_attendance_name ON attendance_events (name, recorded_at);
+CREATE INDEX IF NOT EXISTS idx_attendance_session ON attendance_events (session_id, name, recorded_at);
+"""
+
+INSERT_SQL = """
+INSERT INTO attendance_events (session_id, name, status, recorded_at, day, distance, source)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+REPORT_COLUMNS = ["Name", "Status", "First Seen", "Last Seen", "Events", "Best Distance"]
+
+logger = logging.getLogger("FaceAttendanceServer")
+
+
+class AttendanceLedger:
+    def __init__(self, db_path, interval=0.5, max_batch=1000):
+        self.db_path = db_path
+        self.interval = interval
+        self.max_batch = max_batch
+        self.rows_written = 0
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+        self._queue = queue.Queue()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="attendance-ledger", daemon=True)
+        self._thread.start()
+
+    def _connect(self, check_same_thread=True):
+        conn = sqlite3.connect(self.db_path, timeout=10, check_same_thread=check_same_thread)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _reader(self):
+        """One read connection per thread"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    # --- Writes --- #
+
+    def record(self, session_id, name, status, distance=None, source="camera", recorded_at=None):
+        """Queue one event; it is committed within ``interval`` seconds"""
+        recorded_at = recorded_at if recorded_at is not None else time.time()
+        day = datetime.date.fromtimestamp(recorded_at).isoformat()
+        distance = float(distance) if distance is not None else None
+        self._queue.put((session_id, name, status, recorded_at, day, distance, source))
+
+    def flush(self):
+        """Block until every queued event is committed"""
+        self._queue.join()
+
+    def close(self):
+        self.flush()
+        self._closed.set()
+        self._thread.join()
+
+    def _run(self):
+        conn = self._connect()
+        while not self._closed.is_set():
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            batch = [first]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                with conn:
+                    conn.executemany(INSERT_SQL, batch)
+                self.rows_written += len(batch)
+            except sqlite3.Error as e:
+                logger.error(f"Writing {len(batch)} attendance events failed: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+        conn.close()
+
+    # --- Queries --- #
+
+    def _where(self, day=None, name=None, session_id=None):
+        clauses, params = [], []
+        for column, value in (("day", day), ("name", name), ("session_id", session_id)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def events(self, day=None, name=None, session_id=None, limit=None):
+        """Events matching the filters, oldest first, as dicts"""
+        where, params = self._where(day, name, session_id)
+        sql = f"SELECT id, session_id, name, status, recorded_at, distance, source FROM attendance_events{where} ORDER BY recorded_at, id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        columns = ["id", "session_id", "name", "status", "recorded_at", "distance", "source"]
+        return [dict(zip(columns, row)) for row in self._reader().execute(sql, params)]
+
+    def summary(self, day=None, session_id=None, conn=None):
+        """Yield one report row per person: the latest status wins (a manual mark overrides the camera)"""
+        where, params = self._where(day=day, session_id=session_id)
+        cursor = (conn or self._reader()).execute(
+            f"SELECT name, status, recorded_at, distance FROM attendance_events{where} ORDER BY name, recorded_at, id",
+            params
+        )
+        current = None
+        for name, status, recorded_at, distance in cursor:
+            if current is None or current[0] != name:
+                if current is not None:
+                    yield _report_row(current)
+                current = [name, status, recorded_at, recorded_at, 0, None]
+            current[1] = status
+            current[3] = recorded_at
+            current[4] += 1
+            if distance is not None and (current[5] is None or distance < current[5]):
+                current[5] = distance
+        if current is not None:
+            yield _report_row(current)
+
+    def stream_csv(self, day=None, session_id=None):
+        """Report as CSV text chunks, one per row.
+
+        A streaming response advances the generator on whichever worker
+        thread is free, so it reads through its own connection rather than
+        the calling thread's one; the connection is only read from.
+        """
+        conn = self._connect(check_same_thread=False)
+        try:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(REPORT_COLUMNS)
+            for row in self.summary(day, session_id, conn=conn):
+                writer.writerow(row)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            yield buffer.getvalue()
+        finally:
+            conn.close()
+
+    def excel_report(self, day=None, session_id=None):
+        """Report as .xlsx bytes (write-only workbook, rows are not kept in memory)"""
+        from openpyxl import Workbook
+
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet("Attendance")
+        sheet.append(REPORT_COLUMNS)
+        for row in self.summary(day, session_id):
+            sheet.append(row)
+        output = io.BytesIO()
+        workbook.save(output)
+        return output.getvalue()
+
+
+def _format_time(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _report_row(state):
+    name, status, first_seen, last_seen, events, best_distance = state
+    return [name, status, _format_time(first_seen), _format_time(last_seen), events,
+            round(best_distance, 4) if best_distance is not None else ""]
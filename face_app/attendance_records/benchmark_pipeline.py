@@ -0,0 +1,254 @@
+"""Benchmark the face recognition pipeline by replaying recorded footage.
+
+Usage:
+    python benchmark_pipeline.py --source video:class.mp4 [--replay-dir .] [--frames 200]
+                                 [--gallery-sizes 100,1000,10000,100000] [--index exact]
+                                 [--detection-scale 0.5] [--out results.json]
+                                 [--baseline previous.json --tolerance 0.2]
+
+Frames are read from a frame source (video:<path> or images:<dir>, paths
+relative to --replay-dir) and every face of every frame goes through the
+stages of the capture loop (FrameProcessor and the server's identify_faces):
+decode, detect (on the downscaled copy), encode and match. Decode, detect
+and encode do not depend on the gallery, so they are measured once;
+matching is measured against synthetic galleries of each requested size,
+with the build time and memory of every gallery. The frames/sec of the
+whole pipeline is reported per gallery size, plus the tracked pipeline
+(FrameProcessor, which only encodes new or unidentified faces) against the
+largest gallery. Results are printed as JSON; with --baseline, timings
+more than --tolerance slower than the baseline are reported and the exit
+code is 1.
+"""
+import argparse
+import json
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+
+import cv2
+import face_recognition
+import numpy as np
+
+from frame_pipeline import FrameProcessor, detect_faces
+from frame_sources import open_source
+from gallery_index import ENCODING_DIM, GALLERY_INDEXES, create_index
+
+MATCH_TOLERANCE = 0.4
+DEFAULT_GALLERY_SIZES = (100, 1000, 10000, 100000)
+
+
+def percentile(samples, p):
+    return float(np.percentile(samples, p)) if samples else None
+
+
+def latency_summary(samples_ms):
+    return {
+        "count": len(samples_ms),
+        "mean_ms": float(np.mean(samples_ms)) if samples_ms else None,
+        "p50_ms": percentile(samples_ms, 50),
+        "p99_ms": percentile(samples_ms, 99),
+        "max_ms": max(samples_ms) if samples_ms else None,
+    }
+
+
+def synthetic_gallery(size, seed=None):
+    """Random encodings of roughly unit length, the scale of real face embeddings"""
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(0.0, 1.0, size=(size, ENCODING_DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def read_frames(spec, limit, root="."):
+    """Decode up to ``limit`` frames; returns (frames, per-frame decode ms)"""
+    source = open_source(spec, root)
+    frames, decode_ms = [], []
+    try:
+        while len(frames) < limit:
+            start = time.perf_counter()
+            ok, frame = source.read()
+            elapsed = (time.perf_counter() - start) * 1000
+            if not ok:
+                break
+            frames.append(frame)
+            decode_ms.append(elapsed)
+    finally:
+        source.release()
+    return frames, decode_ms
+
+
+def measure_stages(frames, detection_scale):
+    """Detect and encode every face of every frame; returns (detect ms, encode ms, encodings per frame)"""
+    detect_ms, encode_ms, faces = [], [], []
+    for frame in frames:
+        rgb_img = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        start = time.perf_counter()
+        boxes = detect_faces(rgb_img, detection_scale)
+        detect_ms.append((time.perf_counter() - start) * 1000)
+        encodings = []
+        if boxes:
+            start = time.perf_counter()
+            encodings = face_recognition.face_encodings(rgb_img, boxes)
+            encode_ms.append((time.perf_counter() - start) * 1000)
+        faces.append(np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_DIM))
+    return detect_ms, encode_ms, faces
+
+
+def build_gallery(kind, vectors, options):
+    """Build an index over ``vectors``; returns (index, build stats)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    index = create_index(kind, **options)
+    index.build(vectors)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return index, {"seconds": elapsed, "retained_bytes": current, "peak_bytes": peak}
+
+
+def measure_matching(index, faces):
+    match_ms = []
+    for encodings in faces:
+        if not len(encodings):
+            continue
+        start = time.perf_counter()
+        index.search(encodings, MATCH_TOLERANCE)
+        match_ms.append((time.perf_counter() - start) * 1000)
+    return match_ms
+
+
+def measure_tracked(frames, index, names, detection_scale):
+    """End-to-end FrameProcessor throughput (decoded frames, tracking on)"""
+    encoded = []
+
+    def identify(rgb_img, boxes):
+        encodings = face_recognition.face_encodings(rgb_img, boxes)
+        encoded.append(len(encodings))
+        rows, distances = index.search(encodings, MATCH_TOLERANCE)
+        return [(names[row] if row >= 0 else None, float(distance)) for row, distance in zip(rows, distances)]
+
+    processor = FrameProcessor(identify, detection_scale=detection_scale)
+    start = time.perf_counter()
+    for frame in frames:
+        processor.process(frame)
+    elapsed = time.perf_counter() - start
+    return {
+        "frames": len(frames),
+        "seconds": elapsed,
+        "frames_per_second": len(frames) / elapsed if elapsed else None,
+        "faces_encoded": sum(encoded),
+    }
+
+
+def run(spec, frame_limit, gallery_sizes, kind, options, detection_scale, seed, tracked=True, root="."):
+    results = {
+        "params": {
+            "source": spec, "frames": frame_limit, "gallery_sizes": list(gallery_sizes),
+            "index": kind, "index_options": options, "detection_scale": detection_scale, "seed": seed,
+        },
+        "environment": {
+            "python": platform.python_version(), "machine": platform.machine(), "opencv": cv2.__version__,
+        },
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+    frames, decode_ms = read_frames(spec, frame_limit, root)
+    if not frames:
+        raise SystemExit(f"No frames could be read from {spec}")
+    height, width = frames[0].shape[:2]
+    detect_ms, encode_ms, faces = measure_stages(frames, detection_scale)
+    results["frames"] = {
+        "count": len(frames), "width": width, "height": height,
+        "faces": int(sum(len(encodings) for encodings in faces)),
+        "frames_with_faces": sum(1 for encodings in faces if len(encodings)),
+    }
+    results["stages"] = {
+        "decode": latency_summary(decode_ms),
+        "detect": latency_summary(detect_ms),
+        "encode": latency_summary(encode_ms),
+    }
+    # Time every frame spends outside matching, whatever the gallery size
+    fixed_seconds = (sum(decode_ms) + sum(detect_ms) + sum(encode_ms)) / 1000
+
+    results["galleries"] = {}
+    index = None
+    for size in gallery_sizes:
+        vectors = synthetic_gallery(size, seed)
+        index, build = build_gallery(kind, vectors, options)
+        match_ms = measure_matching(index, faces)
+        total_seconds = fixed_seconds + sum(match_ms) / 1000
+        results["galleries"][str(size)] = {
+            "build": build,
+            "vectors_bytes": int(vectors.nbytes),
+            "match": latency_summary(match_ms),
+            "seconds": total_seconds,
+            "frames_per_second": len(frames) / total_seconds if total_seconds else None,
+        }
+
+    if tracked and index is not None:
+        names = [f"person_{i}" for i in range(len(index))]
+        results["tracked"] = {"gallery_size": len(index), **measure_tracked(frames, index, names, detection_scale)}
+    results["max_rss_kb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return results
+
+
+# percentile and find_regressions mirror social_network_app/backend/benchmark_recommendations.py,
+# so both benchmarks flag regressions the same way; change them together
+def find_regressions(results, baseline, tolerance):
+    """Timings that got slower than the baseline by more than ``tolerance`` (a fraction)"""
+    regressions = []
+
+    def walk(current, previous, path):
+        for key, value in current.items():
+            if key not in previous:
+                continue
+            if isinstance(value, dict) and isinstance(previous[key], dict):
+                walk(value, previous[key], f"{path}{key}.")
+            elif (key == "seconds" or key.endswith("_ms")) and value and previous[key]:
+                if value > previous[key] * (1 + tolerance):
+                    regressions.append({"metric": path + key, "baseline": previous[key], "current": value})
+
+    walk(results, baseline, "")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the face recognition pipeline on recorded footage")
+    parser.add_argument("--source", required=True, help="Frame source: video:<path> or images:<dir>")
+    parser.add_argument("--replay-dir", default=".", help="Directory the source path is relative to")
+    parser.add_argument("--frames", type=int, default=200, help="Maximum number of frames to replay")
+    parser.add_argument("--gallery-sizes", default=",".join(map(str, DEFAULT_GALLERY_SIZES)),
+                        help="Comma-separated synthetic gallery sizes")
+    parser.add_argument("--index", default="exact", choices=sorted(GALLERY_INDEXES), help="Gallery index")
+    parser.add_argument("--nlist", type=int, help="IVF partitions (default: about sqrt of the gallery size)")
+    parser.add_argument("--nprobe", type=int, default=8, help="IVF partitions scanned per query")
+    parser.add_argument("--detection-scale", type=float, default=0.5, help="Downscale factor for detection")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-tracked", action="store_true", help="Skip the FrameProcessor measurement")
+    parser.add_argument("--out", help="Also write the JSON results to this file")
+    parser.add_argument("--baseline", help="Earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown vs. the baseline")
+    args = parser.parse_args(argv)
+
+    gallery_sizes = sorted(int(size) for size in args.gallery_sizes.split(",") if size.strip())
+    options = {"nlist": args.nlist, "nprobe": args.nprobe} if args.index == "ivf" else {}
+    results = run(args.source, args.frames, gallery_sizes, args.index, options, args.detection_scale,
+                  args.seed, tracked=not args.skip_tracked, root=args.replay_dir)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            results["regressions"] = find_regressions(results, json.load(f), args.tolerance)
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output + "\n")
+    if results.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""Append-only, memory-mapped store for face encodings.
+
+A store is a directory with three files:
+
+    vectors.f32    float32 rows of ENCODING_DIM values, one per face (id = row number)
+    names.jsonl    one JSON object per line, {"name", "source", "file"} of the face with the
+                   same id; source is the SHA-256 of the image it was encoded from and file
+                   its name in known_faces/, if known
+    manifest.json  {"version", "dim", "count", "names_bytes", "removed"}, replaced atomically
+
+Only the rows and name lines counted by the manifest exist. An append
+writes and fsyncs the new rows and names past that point and then commits
+by replacing the manifest, so a crash mid-append leaves the previous store
+intact; the torn tail is cut off by the next append.
+
+Rows are never rewritten. A face whose image was replaced or deleted is
+retired by listing its id in the manifest's "removed" tombstones, in the
+same commit as its replacement; retired rows keep their space on disk.
+"""
+import json
+import os
+import pickle
+import threading
+
+import numpy as np
+
+ENCODING_DIM = 128
+FORMAT_VERSION = 1
+
+VECTORS_FILE = "vectors.f32"
+NAMES_FILE = "names.jsonl"
+MANIFEST_FILE = "manifest.json"
+
+
+class StoreError(Exception):
+    """The store on disk is missing or inconsistent"""
+
+
+def _fsync_dir(path):
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+class EncodingStore:
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        manifest_path = self._path(MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                manifest = json.load(f)
+            if manifest.get("version") != FORMAT_VERSION or manifest.get("dim") != ENCODING_DIM:
+                raise StoreError(f"Unsupported encoding store in {directory}: {manifest}")
+        else:
+            manifest = {"version": FORMAT_VERSION, "dim": ENCODING_DIM, "count": 0, "names_bytes": 0}
+        self._count = manifest["count"]
+        self._names_bytes = manifest["names_bytes"]
+        self.removed = set(manifest.get("removed", ()))
+        self.names, self.sources, self.files = self._read_names()
+        self.vectors = self._map_vectors(self._count)
+
+    def _path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    def _read_names(self):
+        if not self._count:
+            return [], [], []
+        with open(self._path(NAMES_FILE), "rb") as f:
+            lines = f.read(self._names_bytes).splitlines()
+        if len(lines) != self._count:
+            raise StoreError(f"{NAMES_FILE} has {len(lines)} names, manifest says {self._count}")
+        records = [json.loads(line) for line in lines]
+        return ([record["name"] for record in records], [record.get("source") for record in records],
+                [record.get("file") for record in records])
+
+    def _map_vectors(self, count):
+        if not count:
+            return np.empty((0, ENCODING_DIM), dtype=np.float32)
+        # Read-only and zero-copy: pages are loaded from the file on first touch
+        return np.memmap(self._path(VECTORS_FILE), dtype=np.float32, mode="r", shape=(count, ENCODING_DIM))
+
+    def __len__(self):
+        return self._count
+
+    def live_ids(self):
+        """Ids of the faces that have not been retired"""
+        return [face_id for face_id in range(self._count) if face_id not in self.removed]
+
+    def ids_for_files(self, files):
+        """Live ids encoded from any of ``files`` (names in known_faces/).
+
+        Faces stored without a file (migrated from encodings.pkl or enrolled
+        before files were recorded) match a file with the same base name.
+        """
+        files = set(files)
+        stems = {os.path.splitext(filename)[0] for filename in files}
+        return [
+            face_id for face_id in self.live_ids()
+            if self.files[face_id] in files or (self.files[face_id] is None and self.names[face_id] in stems)
+        ]
+
+    def append(self, names, vectors, sources=None, files=None, replace=()):
+        """Durably add faces, retiring the ids in ``replace`` in the same commit; returns the first new id"""
+        vectors = np.ascontiguousarray(np.asarray(vectors, dtype=np.float32).reshape(-1, ENCODING_DIM))
+        if len(names) != len(vectors):
+            raise ValueError(f"Got {len(names)} names for {len(vectors)} encodings")
+        replace = set(replace) - self.removed
+        if not len(names) and not replace:
+            return self._count
+        sources = list(sources) if sources is not None else [None] * len(names)
+        files = list(files) if files is not None else [None] * len(names)
+        name_lines = "".join(
+            json.dumps({"name": name, "source": source, "file": filename}) + "\n"
+            for name, source, filename in zip(names, sources, files)
+        ).encode("utf-8")
+
+        with self._lock:
+            first_id = self._count
+            if any(face_id >= first_id for face_id in replace):
+                raise ValueError("Cannot retire faces that are not in the store")
+            row_bytes = ENCODING_DIM * np.dtype(np.float32).itemsize
+            # Cut off anything an interrupted append left past the committed end
+            for filename, size, payload in ((VECTORS_FILE, first_id * row_bytes, vectors.tobytes()),
+                                            (NAMES_FILE, self._names_bytes, name_lines)):
+                with open(self._path(filename), "ab") as f:
+                    f.truncate(size)
+                    f.write(payload)
+                    f.flush()
+                    os.fsync(f.fileno())
+
+            manifest = {
+                "version": FORMAT_VERSION,
+                "dim": ENCODING_DIM,
+                "count": first_id + len(vectors),
+                "names_bytes": self._names_bytes + len(name_lines),
+                "removed": sorted(self.removed | replace),
+            }
+            tmp_path = self._path(MANIFEST_FILE + ".tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(manifest, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self._path(MANIFEST_FILE))
+            _fsync_dir(self.directory)
+
+            # Names first, so any row a reader can see already has its name
+            self.names.extend(names)
+            self.sources.extend(sources)
+            self.files.extend(files)
+            self.removed |= replace
+            self.vectors = self._map_vectors(manifest["count"])
+            self._names_bytes = manifest["names_bytes"]
+            self._count = manifest["count"]
+        return first_id
+
+
+def migrate_pickle(pickle_path, directory):
+    """Create a store from a legacy encodings.pkl ({"encodings": [...], "names": [...]})"""
+    with open(pickle_path, "rb") as f:
+        legacy = pickle.load(f)
+    store = EncodingStore(directory)
+    if len(store):
+        raise StoreError(f"Refusing to migrate into non-empty store {directory}")
+    store.append(list(legacy["names"]), legacy["encodings"])
+    return store
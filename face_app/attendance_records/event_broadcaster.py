@@ -0,0 +1,68 @@
+"""Publish/subscribe fan-out of server events to WebSocket clients.
+
+publish() may be called from any thread (the capture thread, the executor,
+request handlers); events are handed to the event loop with
+call_soon_threadsafe and copied into every subscriber's bounded queue.
+
+A subscriber that falls ``max_queue`` events behind loses its backlog and
+gets one full snapshot instead, so a slow dashboard skips intermediate
+states rather than holding memory or slowing everyone else down.
+"""
+import asyncio
+
+
+class Subscriber:
+    def __init__(self, max_queue):
+        self.queue = asyncio.Queue(maxsize=max_queue)
+        self.resyncs = 0
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class EventBroadcaster:
+    def __init__(self, snapshot, max_queue=256):
+        """``snapshot()`` returns the full state sent to new and lagging subscribers"""
+        self.snapshot = snapshot
+        self.max_queue = max_queue
+        self.published = 0
+        self._subscribers = set()
+        self._loop = None
+
+    def bind(self, loop):
+        """Attach to the event loop that serves the subscribers"""
+        self._loop = loop
+
+    def subscribe(self):
+        subscriber = Subscriber(self.max_queue)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self._subscribers.discard(subscriber)
+
+    @property
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def publish(self, event):
+        """Queue ``event`` for every subscriber; safe to call from any thread"""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            loop.call_soon_threadsafe(self._fan_out, event)
+        except RuntimeError:
+            pass  # loop shut down between the check and the call
+
+    def _fan_out(self, event):
+        self.published += 1
+        for subscriber in list(self._subscribers):
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Too far behind: replace the backlog with the current state
+                while not subscriber.queue.empty():
+                    subscriber.queue.get_nowait()
+                subscriber.queue.put_nowait({"type": "snapshot", **self.snapshot()})
+                subscriber.resyncs += 1
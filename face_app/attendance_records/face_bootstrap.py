@@ -0,0 +1,193 @@
+"""Background encoding of the images in known_faces/.
+
+Images are identified by the SHA-256 of their content, so only new or
+changed files are encoded; an identical copy of an image that is already
+encoded is skipped. The encoding of a changed file replaces the faces
+stored for that file, and the faces of deleted files (or of files that no
+longer show a face) are retired. A face whose file is gone but whose
+content is still in the folder under another name (a rename, or a copy
+whose original was deleted) moves to that file without being encoded
+again. Encoding (HOG detection plus the face embedding network) runs in a
+process pool and results are enrolled in small batches as they arrive, so
+the server can answer with a partial gallery while the rest loads.
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import hashlib
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+COMMIT_BATCH = 32  # encodings enrolled together
+COMMIT_INTERVAL = 2.0  # seconds before a partial batch is enrolled anyway
+
+logger = logging.getLogger("FaceAttendanceServer")
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def encode_image(path):
+    """Encoding of the first face in an image file, or None (runs in a worker process)"""
+    import face_recognition
+
+    image = face_recognition.load_image_file(path)
+    encodings = face_recognition.face_encodings(image)
+    return encodings[0] if encodings else None
+
+
+def pending_images(directory, store):
+    """Reconcile the store with the images in ``directory``.
+
+    Returns (pending, moved, deleted): (path, name, digest) for every image
+    whose content is not in the store yet, (id, path, name, digest) for
+    every face whose image file is gone but whose content another file
+    still carries, and the ids of faces whose image is gone altogether.
+    Faces migrated from encodings.pkl have no digest, so their images are
+    encoded again once and replace them.
+    """
+    live_ids = store.live_ids()
+    filenames = sorted(f for f in os.listdir(directory) if f.lower().endswith(IMAGE_EXTENSIONS))
+    digests = {filename: file_digest(os.path.join(directory, filename)) for filename in filenames}
+
+    # Content that is stored under a file that still holds it
+    encoded = {
+        store.sources[face_id] for face_id in live_ids
+        if store.files[face_id] in digests and digests[store.files[face_id]] == store.sources[face_id]
+    }
+    # First file carrying each piece of content that is not stored under it
+    unclaimed = {}
+    for filename in filenames:
+        if digests[filename] not in encoded:
+            unclaimed.setdefault(digests[filename], filename)
+
+    # Faces without a recorded file cannot be tied to a deletion, so they are kept
+    moved, deleted = [], []
+    for face_id in live_ids:
+        if store.files[face_id] is None or store.files[face_id] in digests:
+            continue
+        digest = store.sources[face_id]
+        if digest in unclaimed:
+            filename = unclaimed.pop(digest)
+            moved.append((face_id, os.path.join(directory, filename), os.path.splitext(filename)[0], digest))
+            encoded.add(digest)
+        else:
+            deleted.append(face_id)
+
+    pending = []
+    for filename in filenames:
+        digest = digests[filename]
+        if digest not in encoded:
+            encoded.add(digest)  # identical copies are encoded once
+            pending.append((os.path.join(directory, filename), os.path.splitext(filename)[0], digest))
+    return pending, moved, deleted
+
+
+class GalleryBootstrap:
+    """Encodes pending images on a background thread and reports progress.
+
+    ``enroll(names, vectors, sources, files, replace)`` is called with each
+    batch of new encodings (faces already stored for their files are
+    replaced) and ids to retire, and ``on_finish()`` once the run is over,
+    even if it failed part way.
+    """
+
+    def __init__(self, directory, store, enroll, on_finish=None, workers=None):
+        self.directory = directory
+        self.store = store
+        self.enroll = enroll
+        self.on_finish = on_finish
+        self.workers = workers or os.cpu_count() or 1
+        self.progress = {"status": "idle", "total": 0, "done": 0, "encoded": 0, "no_face": 0, "failed": 0,
+                         "moved": 0, "removed": 0}
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="gallery-bootstrap", daemon=True)
+        self._thread.start()
+
+    def run(self):
+        start = time.time()
+        status = "completed"
+        try:
+            self._reconcile()
+        except Exception as e:
+            # A broken worker pool or a failed enroll must not leave the status stuck
+            logger.exception("Gallery bootstrap failed")
+            self.progress["error"] = str(e)
+            status = "failed"
+        if self.on_finish is not None:
+            try:
+                self.on_finish()
+            except Exception as e:
+                logger.exception("Could not save the gallery after bootstrap")
+                self.progress.setdefault("error", str(e))
+                status = "failed"
+        self.progress["status"] = status
+        logger.info(f"Gallery bootstrap finished in {time.time() - start:.1f}s: {self.progress}")
+
+    def _reconcile(self):
+        self.progress["status"] = "scanning"
+        pending, moved, deleted = pending_images(self.directory, self.store)
+        if moved:
+            # Same content under a new file name: reuse the stored encoding
+            logger.info(f"Moving {len(moved)} encodings to their renamed or copied images")
+            face_ids, paths, names, digests = (list(column) for column in zip(*moved))
+            vectors = [self.store.vectors[face_id] for face_id in face_ids]
+            self.enroll(names, vectors, digests, [os.path.basename(path) for path in paths], face_ids)
+            self.progress["moved"] += len(moved)
+        if deleted:
+            logger.info(f"Retiring {len(deleted)} encodings whose images were deleted")
+            self.enroll([], [], [], [], deleted)
+            self.progress["removed"] += len(deleted)
+        self.progress.update({"status": "encoding", "total": len(pending)})
+        if pending:
+            logger.info(f"Encoding {len(pending)} new or changed images with {self.workers} workers")
+            self._encode(pending)
+
+    def _encode(self, pending):
+        batch, retired = [], []
+        last_commit = time.monotonic()
+        # spawn, not fork: the server process already runs threads
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=context) as pool:
+            futures = {pool.submit(encode_image, path): (path, name, digest) for path, name, digest in pending}
+            for future in as_completed(futures):
+                path, name, digest = futures[future]
+                try:
+                    encoding = future.result()
+                except Exception as e:
+                    self.progress["failed"] += 1
+                    logger.warning(f"Could not encode {path}: {e}")
+                else:
+                    if encoding is None:
+                        self.progress["no_face"] += 1
+                        logger.warning(f"No face found in {path}")
+                        # Whatever was encoded from an earlier version of this file is stale now
+                        retired.extend(self.store.ids_for_files([os.path.basename(path)]))
+                    else:
+                        batch.append((name, encoding, digest, os.path.basename(path)))
+                self.progress["done"] += 1
+
+                pending_commit = batch or retired
+                if len(batch) >= COMMIT_BATCH or (pending_commit and time.monotonic() - last_commit > COMMIT_INTERVAL):
+                    self._commit(batch, retired)
+                    batch, retired = [], []
+                    last_commit = time.monotonic()
+        self._commit(batch, retired)
+
+    def _commit(self, batch, retired):
+        if not batch and not retired:
+            return
+        names, vectors, sources, files = (list(column) for column in zip(*batch)) if batch else ([], [], [], [])
+        self.enroll(names, vectors, sources, files, retired)
+        self.progress["encoded"] += len(batch)
+        self.progress["removed"] += len(set(retired))
+        logger.info(f"Enrolled {self.progress['encoded']} encodings ({self.progress['done']}/{self.progress['total']} images)")
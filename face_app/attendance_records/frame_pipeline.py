@@ -0,0 +1,199 @@
+"""Staged camera pipeline: frame grabbing, downscaled detection and face tracking.
+
+A FrameGrabber thread keeps reading the camera into a small queue and drops
+the oldest frame when the consumer falls behind, so processing always sees
+a recent frame; recorded footage is read at the consumer's pace instead.
+FrameProcessor detects faces on a downscaled copy, follows them across
+frames by box overlap (IoU) and only asks for an encoding when a track is
+new or still unidentified, instead of encoding every face in every frame.
+"""
+import queue
+import threading
+
+import cv2
+import face_recognition
+import numpy as np
+
+from metrics import stage
+
+
+class FrameGrabber:
+    """Reads frames from a cv2.VideoCapture-like source on its own thread.
+
+    With ``drop_stale`` the oldest queued frame is discarded when the queue is
+    full; without it the reader waits, so no frame is skipped.
+    """
+
+    def __init__(self, capture, max_queue=2, drop_stale=True):
+        self.capture = capture
+        self.drop_stale = drop_stale
+        self.frames = queue.Queue(maxsize=max_queue)
+        self.dropped = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="frame-grabber", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stopped.is_set():
+            ret, frame = self.capture.read()
+            if not ret:
+                frame = None  # end of stream
+            while not self._stopped.is_set():
+                try:
+                    if self.drop_stale:
+                        self.frames.put_nowait(frame)
+                    else:
+                        self.frames.put(frame, timeout=0.1)
+                    break
+                except queue.Full:
+                    if not self.drop_stale:
+                        continue
+                    # Drop the stalest frame rather than the newest
+                    try:
+                        self.frames.get_nowait()
+                        self.dropped += 1
+                    except queue.Empty:
+                        pass
+            if frame is None:
+                return
+
+    def read(self, timeout=None):
+        """Next frame, or None once the source is exhausted or nothing arrives in time"""
+        try:
+            return self.frames.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout=5)
+
+
+def detect_faces(rgb_img, scale=1.0, model="hog"):
+    """face_locations on a copy resized by ``scale``, with boxes mapped back to full resolution"""
+    if scale == 1.0:
+        return face_recognition.face_locations(rgb_img, model=model)
+    small = cv2.resize(rgb_img, (0, 0), fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    height, width = rgb_img.shape[:2]
+    boxes = []
+    for top, right, bottom, left in face_recognition.face_locations(small, model=model):
+        boxes.append((
+            max(0, int(round(top / scale))),
+            min(width, int(round(right / scale))),
+            min(height, int(round(bottom / scale))),
+            max(0, int(round(left / scale))),
+        ))
+    return boxes
+
+
+def iou_matrix(boxes_a, boxes_b):
+    """Intersection over union of every (top, right, bottom, left) box pair"""
+    a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    top = np.maximum(a[:, None, 0], b[None, :, 0])
+    right = np.minimum(a[:, None, 1], b[None, :, 1])
+    bottom = np.minimum(a[:, None, 2], b[None, :, 2])
+    left = np.maximum(a[:, None, 3], b[None, :, 3])
+    intersection = np.clip(right - left, 0, None) * np.clip(bottom - top, 0, None)
+    area_a = (a[:, 1] - a[:, 3]) * (a[:, 2] - a[:, 0])
+    area_b = (b[:, 1] - b[:, 3]) * (b[:, 2] - b[:, 0])
+    union = area_a[:, None] + area_b[None, :] - intersection
+    return np.divide(intersection, union, out=np.zeros_like(intersection), where=union > 0)
+
+
+class Track:
+    def __init__(self, track_id, box):
+        self.track_id = track_id
+        self.box = box
+        self.name = None  # set once the face is identified
+        self.distance = None  # match distance of the latest encoding
+        self.attempts = 0  # encodings tried so far
+        self.last_attempt = None  # frame index of the last encoding
+        self.missed = 0
+
+
+class FaceTracker:
+    """Greedy IoU association of detections with the faces seen in earlier frames"""
+
+    def __init__(self, iou_threshold=0.3, max_missed=10):
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.tracks = []
+        self._next_id = 0
+
+    def update(self, boxes):
+        """Assign this frame's boxes to tracks; returns the tracks seen in this frame"""
+        seen = []
+        unmatched_boxes = set(range(len(boxes)))
+        unmatched_tracks = set(range(len(self.tracks)))
+        if self.tracks and boxes:
+            overlaps = iou_matrix([track.box for track in self.tracks], boxes)
+            for flat in np.argsort(overlaps, axis=None)[::-1]:
+                t, b = np.unravel_index(flat, overlaps.shape)
+                if overlaps[t, b] < self.iou_threshold:
+                    break
+                if t in unmatched_tracks and b in unmatched_boxes:
+                    track = self.tracks[t]
+                    track.box = boxes[b]
+                    track.missed = 0
+                    unmatched_tracks.discard(t)
+                    unmatched_boxes.discard(b)
+                    seen.append(track)
+
+        for t in unmatched_tracks:
+            self.tracks[t].missed += 1
+        self.tracks = [track for track in self.tracks if track.missed <= self.max_missed]
+
+        for b in sorted(unmatched_boxes):
+            track = Track(self._next_id, boxes[b])
+            self._next_id += 1
+            self.tracks.append(track)
+            seen.append(track)
+        return seen
+
+
+class FrameProcessor:
+    """Detects and tracks faces, identifying each track as few times as possible.
+
+    ``identify(rgb_img, boxes)`` returns a (name, distance) pair per box,
+    name None for an unknown face. Identified tracks are never encoded
+    again; unidentified ones are retried every ``retry_interval`` frames
+    while they stay in view. ``last_identified`` holds the tracks encoded
+    for the latest frame.
+    """
+
+    def __init__(self, identify, detection_scale=0.5, retry_interval=5, tracker=None):
+        self.identify = identify
+        self.detection_scale = detection_scale
+        self.retry_interval = retry_interval
+        self.tracker = tracker or FaceTracker()
+        self.frame_index = 0
+        self.last_identified = []
+
+    def process(self, frame):
+        """Process one BGR frame; returns the tracks visible in it"""
+        rgb_img = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+        with stage("face_detect"):
+            boxes = detect_faces(rgb_img, self.detection_scale)
+        tracks = self.tracker.update(boxes)
+
+        pending = [
+            track for track in tracks
+            if track.name is None
+            and (track.last_attempt is None or self.frame_index - track.last_attempt >= self.retry_interval)
+        ]
+        if pending:
+            results = self.identify(rgb_img, [track.box for track in pending])
+            for track, (name, distance) in zip(pending, results):
+                track.attempts += 1
+                track.last_attempt = self.frame_index
+                track.name = name
+                track.distance = distance
+        self.last_identified = pending
+
+        self.frame_index += 1
+        return tracks
@@ -0,0 +1,124 @@
+"""Where attendance capture reads its frames from: a camera, a video file or a directory of images.
+
+Every source has the part of the cv2.VideoCapture interface the capture
+loop uses (read() -> (ok, frame) and release()), so recorded footage goes
+through exactly the same pipeline as the live camera and can be replayed on
+a headless machine. Sources are chosen with a spec string:
+
+    camera         the default camera (camera:1 for another device index)
+    video:<path>   a video file, decoded frame by frame
+    images:<path>  the images in a directory, in filename order
+
+Paths are resolved inside a replay root and may not point outside it.
+Recorded sources are not "live": frames are not dropped when processing
+falls behind, every frame is processed in order.
+"""
+import os
+import sys
+
+import cv2
+
+from metrics import stage
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+SOURCE_KINDS = ("camera", "video", "images")
+
+
+class FrameSourceError(Exception):
+    """The frame source spec is invalid or the source cannot be opened"""
+
+
+class CameraSource:
+    live = True
+
+    def __init__(self, device=0):
+        # DirectShow opens webcams much faster on Windows; elsewhere use the default backend
+        if sys.platform == "win32":
+            self.capture = cv2.VideoCapture(device, cv2.CAP_DSHOW)
+        else:
+            self.capture = cv2.VideoCapture(device)
+
+    def read(self):
+        return self.capture.read()
+
+    def release(self):
+        self.capture.release()
+
+
+class VideoFileSource:
+    live = False
+
+    def __init__(self, path):
+        self.path = path
+        self.capture = cv2.VideoCapture(path)
+        if not self.capture.isOpened():
+            raise FrameSourceError(f"Cannot open video file {path}")
+
+    def read(self):
+        with stage("frame_decode"):
+            return self.capture.read()
+
+    def release(self):
+        self.capture.release()
+
+
+class ImageDirectorySource:
+    live = False
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.paths = [
+            os.path.join(directory, filename) for filename in sorted(os.listdir(directory))
+            if filename.lower().endswith(IMAGE_EXTENSIONS)
+        ]
+        if not self.paths:
+            raise FrameSourceError(f"No images found in {directory}")
+        self.position = 0
+
+    def read(self):
+        # Skip files OpenCV cannot decode instead of ending the replay
+        while self.position < len(self.paths):
+            path = self.paths[self.position]
+            self.position += 1
+            with stage("frame_decode"):
+                frame = cv2.imread(path)
+            if frame is not None:
+                return True, frame
+        return False, None
+
+    def release(self):
+        self.paths = []
+
+
+def parse_source(spec, root="."):
+    """(kind, target) for a source spec; checks the spec without opening anything"""
+    kind, _, target = (spec or "camera").partition(":")
+    if kind not in SOURCE_KINDS:
+        raise FrameSourceError(f"Unknown frame source {kind!r}, expected one of {', '.join(SOURCE_KINDS)}")
+
+    if kind == "camera":
+        try:
+            return kind, int(target) if target else 0
+        except ValueError:
+            raise FrameSourceError(f"Camera index must be a number, got {target!r}")
+
+    if not target:
+        raise FrameSourceError(f"{kind} source needs a path, e.g. {kind}:<path>")
+    root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(root, target))
+    if os.path.commonpath([root, path]) != root:
+        raise FrameSourceError(f"{target} is outside the replay directory")
+    if kind == "video" and not os.path.isfile(path):
+        raise FrameSourceError(f"Video file {target} not found")
+    if kind == "images" and not os.path.isdir(path):
+        raise FrameSourceError(f"Image directory {target} not found")
+    return kind, path
+
+
+def open_source(spec, root="."):
+    kind, target = parse_source(spec, root)
+    if kind == "camera":
+        return CameraSource(target)
+    if kind == "video":
+        return VideoFileSource(target)
+    return ImageDirectorySource(target)
@@ -0,0 +1,298 @@
+"""Nearest-neighbor indexes over the known face encodings.
+
+Both indexes answer the same question as a brute-force scan: which known
+encoding is closest to each query, and is it within the match tolerance.
+"exact" scans every row; "ivf" partitions the gallery with k-means and only
+scans the ``nprobe`` partitions closest to each query, trading a little
+recall for a scan of roughly nprobe / nlist of the gallery.
+
+Vectors are appended while the server runs; searches work on a snapshot of
+the arrays, so they never see a half-written row. The vectors themselves
+live in the encoding store; save() persists only the index structure.
+Retired rows keep their number but get an infinite norm, so they are never
+the closest match; which rows are retired is kept by the encoding store.
+"""
+import os
+import threading
+
+import numpy as np
+
+ENCODING_DIM = 128
+
+# An IVF index scans exhaustively until it has this many vectors to train on
+MIN_TRAIN_SIZE = 1024
+# ...and retrains whenever it has grown this many times over since the last training
+RETRAIN_GROWTH = 4
+TRAIN_SAMPLE_PER_LIST = 256
+KMEANS_ITERATIONS = 10
+ASSIGN_CHUNK = 65536
+
+
+def _as_matrix(vectors):
+    return np.ascontiguousarray(np.asarray(vectors, dtype=np.float32).reshape(-1, ENCODING_DIM))
+
+
+def _sq_norms(matrix):
+    return np.einsum("ij,ij->i", matrix, matrix)
+
+
+def squared_distances(queries, matrix, sq_norms):
+    """(queries x rows) squared Euclidean distances as one matrix product"""
+    # ||a - b||² = ||a||² + ||b||² - 2a·b
+    sq_dist = sq_norms[np.newaxis, :] - 2.0 * (queries @ matrix.T)
+    sq_dist += _sq_norms(queries)[:, np.newaxis]
+    return np.maximum(sq_dist, 0.0, out=sq_dist)
+
+
+def nearest_rows(queries, matrix, sq_norms):
+    """Index and distance of the closest row of ``matrix`` for every query"""
+    best = np.empty(len(queries), dtype=np.int64)
+    distances = np.empty(len(queries), dtype=np.float32)
+    for start in range(0, len(queries), ASSIGN_CHUNK):
+        sq_dist = squared_distances(queries[start:start + ASSIGN_CHUNK], matrix, sq_norms)
+        rows = np.argmin(sq_dist, axis=1)
+        best[start:start + len(rows)] = rows
+        distances[start:start + len(rows)] = np.sqrt(sq_dist[np.arange(len(rows)), rows])
+    return best, distances
+
+
+def kmeans(vectors, k, iterations=KMEANS_ITERATIONS, seed=0):
+    """Lloyd's k-means; returns (centroids, assignment of every vector)"""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    for _ in range(iterations):
+        assignments, _ = nearest_rows(vectors, centroids, _sq_norms(centroids))
+        counts = np.bincount(assignments, minlength=k)
+        order = np.argsort(assignments, kind="stable")
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        filled = counts > 0
+        sums = np.add.reduceat(vectors[order], starts[filled], axis=0)
+        centroids[filled] = sums / counts[filled, np.newaxis]
+        # Restart empty partitions from random vectors
+        if not filled.all():
+            centroids[~filled] = vectors[rng.choice(len(vectors), int((~filled).sum()), replace=False)]
+    assignments, _ = nearest_rows(vectors, centroids, _sq_norms(centroids))
+    return centroids, assignments
+
+
+class ExactIndex:
+    """Brute-force scan over every known encoding"""
+    kind = "exact"
+
+    def __init__(self):
+        self._vectors = np.empty((0, ENCODING_DIM), dtype=np.float32)
+        self._sq_norms = np.empty(0, dtype=np.float32)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def add(self, vectors):
+        """Append vectors; they get the next row numbers, in order"""
+        vectors = _as_matrix(vectors)
+        with self._lock:
+            first_row = self._append(vectors)
+            self._after_add(first_row, vectors)
+
+    def _append(self, vectors):
+        """Write vectors after the current rows and return the first new row number"""
+        count = self._count
+        if not count and not len(self._vectors):
+            # Adopt the first batch as is (e.g. the encoding store's memmap); it is copied on the next add
+            self._sq_norms = _sq_norms(vectors)
+            self._vectors = vectors
+            self._count = len(vectors)
+            return 0
+        if count + len(vectors) > len(self._vectors):
+            capacity = max(count + len(vectors), 2 * len(self._vectors), 64)
+            grown = np.empty((capacity, ENCODING_DIM), dtype=np.float32)
+            grown[:count] = self._vectors[:count]
+            grown_norms = np.empty(capacity, dtype=np.float32)
+            grown_norms[:count] = self._sq_norms[:count]
+            self._vectors, self._sq_norms = grown, grown_norms
+        self._vectors[count:count + len(vectors)] = vectors
+        self._sq_norms[count:count + len(vectors)] = _sq_norms(vectors)
+        # Publish the new rows only once they are written
+        self._count = count + len(vectors)
+        return count
+
+    def _after_add(self, first_row, vectors):
+        pass
+
+    def remove(self, rows):
+        """Exclude rows from every future search"""
+        rows = np.asarray(sorted(rows), dtype=np.int64)
+        with self._lock:
+            rows = rows[rows < self._count]
+            if not len(rows):
+                return
+            if not self._sq_norms.flags.writeable:
+                self._sq_norms = self._sq_norms.copy()
+            self._sq_norms[rows] = np.inf
+
+    def _snapshot(self):
+        count = self._count
+        return self._vectors[:count], self._sq_norms[:count]
+
+    def search(self, queries, tolerance):
+        """(rows, distances) of the closest known encoding per query; row -1 when beyond tolerance"""
+        queries = _as_matrix(queries)
+        vectors, sq_norms = self._snapshot()
+        if not len(vectors) or not len(queries):
+            return np.full(len(queries), -1, dtype=np.int64), np.full(len(queries), np.inf, dtype=np.float32)
+        rows, distances = nearest_rows(queries, vectors, sq_norms)
+        return np.where(distances < tolerance, rows, -1), distances
+
+    def build(self, vectors):
+        """Index ``vectors`` from scratch"""
+        self.add(vectors)
+
+    def _state(self):
+        return {}
+
+    def _restore(self, state):
+        pass
+
+    def save(self, path):
+        """Write the index structure for the current rows; atomic via a temporary file"""
+        with self._lock:
+            state = dict(self._state(), kind=np.array(self.kind), count=np.array(self._count))
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **state)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def load(self, path, vectors):
+        """Restore a saved structure over ``vectors``; False when the file does not describe them"""
+        vectors = _as_matrix(vectors)
+        try:
+            with np.load(path) as saved:
+                state = {key: saved[key] for key in saved.files}
+        except (OSError, ValueError, KeyError):
+            return False
+        if str(state.get("kind")) != self.kind or int(state.get("count", -1)) != len(vectors):
+            return False
+        with self._lock:
+            self._append(vectors)
+            self._restore(state)
+        return True
+
+
+class IVFIndex(ExactIndex):
+    """Inverted-file index: k-means partitions, only the closest ``nprobe`` are scanned.
+
+    ``nlist`` defaults to 4·√N at training time. Raising ``nprobe`` raises
+    recall and latency together; nprobe == nlist is an exact scan. Vectors
+    added after training join the nearest existing partition, so once the
+    gallery has grown RETRAIN_GROWTH times over the partitions are trained
+    again; the trained size is saved with them, so a loaded index retrains
+    too when it is out of date.
+    """
+    kind = "ivf"
+
+    def __init__(self, nlist=None, nprobe=8):
+        super().__init__()
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self._centroids = None
+        self._centroid_norms = None
+        self._lists = []
+        self._trained_size = 0
+
+    def train(self):
+        vectors, _ = self._snapshot()
+        nlist = min(self.nlist or int(4 * np.sqrt(len(vectors))), len(vectors))
+        rng = np.random.default_rng(0)
+        sample_size = min(len(vectors), nlist * TRAIN_SAMPLE_PER_LIST)
+        sample = vectors[np.sort(rng.choice(len(vectors), sample_size, replace=False))]
+        centroids, _ = kmeans(sample, nlist)
+        assignments, _ = nearest_rows(vectors, centroids, _sq_norms(centroids))
+        self._set_partitions(centroids, assignments)
+        self._trained_size = len(vectors)
+
+    def _needs_training(self):
+        if self._centroids is None:
+            return self._count >= MIN_TRAIN_SIZE
+        return self._count >= RETRAIN_GROWTH * self._trained_size
+
+    def _set_partitions(self, centroids, assignments):
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.cumsum(np.bincount(assignments, minlength=len(centroids)))[:-1]
+        self._lists = list(np.split(order.astype(np.int64), bounds))
+        self._centroid_norms = _sq_norms(centroids)
+        self._centroids = centroids
+
+    def build(self, vectors):
+        with self._lock:
+            self._append(_as_matrix(vectors))
+            if self._needs_training():
+                self.train()
+
+    def _after_add(self, first_row, vectors):
+        if self._needs_training():
+            self.train()
+            return
+        if self._centroids is None:
+            return
+        assignments, _ = nearest_rows(vectors, self._centroids, self._centroid_norms)
+        lists = list(self._lists)
+        for offset, partition in enumerate(assignments):
+            lists[partition] = np.append(lists[partition], first_row + offset)
+        self._lists = lists
+
+    def search(self, queries, tolerance):
+        queries = _as_matrix(queries)
+        centroids, centroid_norms, lists = self._centroids, self._centroid_norms, self._lists
+        if centroids is None:
+            return super().search(queries, tolerance)
+
+        vectors, sq_norms = self._snapshot()
+        rows = np.full(len(queries), -1, dtype=np.int64)
+        distances = np.full(len(queries), np.inf, dtype=np.float32)
+        nprobe = min(self.nprobe, len(centroids))
+        centroid_dist = squared_distances(queries, centroids, centroid_norms)
+        probes = np.argpartition(centroid_dist, nprobe - 1, axis=1)[:, :nprobe]
+        for i, probe in enumerate(probes):
+            candidates = np.concatenate([lists[partition] for partition in probe])
+            # Rows appended after the snapshot was taken are not searched yet
+            candidates = candidates[candidates < len(vectors)]
+            if not len(candidates):
+                continue
+            best, best_distance = nearest_rows(queries[i:i + 1], vectors[candidates], sq_norms[candidates])
+            rows[i], distances[i] = candidates[best[0]], best_distance[0]
+        return np.where(distances < tolerance, rows, -1), distances
+
+    def _state(self):
+        if self._centroids is None:
+            return {}
+        assignments = np.empty(self._count, dtype=np.int32)
+        for partition, members in enumerate(self._lists):
+            assignments[members] = partition
+        return {"centroids": self._centroids, "assignments": assignments,
+                "trained_size": np.array(self._trained_size)}
+
+    def _restore(self, state):
+        # Partitions saved without their trained size predate retraining; treat them as stale
+        if "centroids" in state and "trained_size" in state:
+            self._set_partitions(state["centroids"].astype(np.float32), state["assignments"])
+            self._trained_size = int(state["trained_size"])
+        if self._needs_training():
+            self.train()
+
+
+GALLERY_INDEXES = {
+    "exact": ExactIndex,
+    "ivf": IVFIndex,
+}
+
+
+def create_index(kind="exact", **options):
+    """Instantiate a gallery index by name"""
+    try:
+        index_class = GALLERY_INDEXES[kind]
+    except KeyError:
+        raise ValueError(f"Unknown gallery index {kind!r}; expected one of {sorted(GALLERY_INDEXES)}")
+    return index_class(**options)
@@ -0,0 +1,231 @@
+"""In-process metrics in the Prometheus text format, plus an on-demand sampling profiler.
+
+Counters, gauges and histograms are kept in memory by each process and
+rendered by REGISTRY.render() for a /metrics scrape. With several server
+worker processes every worker has its own registry, so each worker is a
+separate scrape target.
+
+The two apps ship separately, so this module is mirrored in
+social_network_app/backend/metrics.py; change both together.
+"""
+from collections import Counter as _Tally
+from contextlib import contextmanager
+import bisect
+import os
+import sys
+import threading
+import time
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r'\"')
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def _samples(self):
+        with self._lock:
+            return [(key, value) for key, value in sorted(self._values.items())]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {_escape(self.documentation)}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in self._samples():
+            lines.append(f"{self.name}{self._labels(key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, then +Inf, sum
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self):
+        with self._lock:
+            return [(key, list(state)) for key, state in sorted(self._values.items())]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {_escape(self.documentation)}", f"# TYPE {self.name} {self.kind}"]
+        for key, state in self._samples():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._labels(key, [('le', _format_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_count{self._labels(key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "Time to produce a response, per route", ("method", "route", "status"))
+REQUESTS_IN_PROGRESS = REGISTRY.gauge(
+    "http_requests_in_progress", "Requests currently being handled, per route", ("method", "route"))
+STAGE_SECONDS = REGISTRY.histogram(
+    "stage_duration_seconds", "Time spent in each hot-path stage", ("stage",))
+
+
+def stage(name):
+    """Context manager timing one stage of a hot path into stage_duration_seconds"""
+    return STAGE_SECONDS.time(stage=name)
+
+
+# --- Sampling profiler --- #
+
+# Set ENABLE_PROFILER=1 to expose the profiler endpoint
+PROFILER_ENABLED = os.environ.get("ENABLE_PROFILER") == "1"
+MAX_PROFILE_SECONDS = 60
+
+
+class SamplingProfiler:
+    """Periodically samples the Python stack of every thread.
+
+    The result is in the collapsed-stack format ("frame;frame;frame count"
+    per line) read by flamegraph.pl and speedscope. Only one profile runs at
+    a time.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self._running = threading.Lock()
+
+    def profile(self, seconds):
+        """Sample for ``seconds`` and return collapsed stacks, or None if a profile is already running"""
+        if not self._running.acquire(blocking=False):
+            return None
+        try:
+            stacks = _Tally()
+            own_thread = threading.get_ident()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own_thread:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                        frame = frame.f_back
+                    stacks[";".join(reversed(stack))] += 1
+                time.sleep(self.interval)
+            return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        finally:
+            self._running.release()
+
+
+PROFILER = SamplingProfiler()
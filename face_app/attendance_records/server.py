@@ -1,19 +1,32 @@
 # server.py
 import face_recognition
-import cv2
 import os
-import numpy as np
-import pickle
 import datetime
+import hashlib
+import io
+import uuid
+import zipfile
 from fastapi import FastAPI, HTTPException, Request, UploadFile, File, BackgroundTasks, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Match
 from starlette.websockets import WebSocketDisconnect
 import uvicorn
-import pandas as pd
+import numpy as np
 import logging
 import time
 import asyncio
+import threading
 from concurrent.futures import ThreadPoolExecutor
+from attendance_ledger import AttendanceLedger
+from encoding_store import EncodingStore, migrate_pickle
+from event_broadcaster import EventBroadcaster
+from face_bootstrap import IMAGE_EXTENSIONS, GalleryBootstrap
+from frame_pipeline import FrameGrabber, FrameProcessor
+from frame_sources import FrameSourceError, open_source, parse_source
+from gallery_index import create_index
+from metrics import (CONTENT_TYPE, MAX_PROFILE_SECONDS, PROFILER, PROFILER_ENABLED, REGISTRY,
+                     REQUEST_SECONDS, REQUESTS_IN_PROGRESS, stage)
 
 executor = ThreadPoolExecutor(max_workers=4)
 
@@ -24,8 +37,13 @@ current_process = {
     "message": "",
     "start_time": None
 }
-attendance = {}  # {name: "P"/"A"}
-data = None
+attendance = {}  # {name: "P"/"A"} for the current session; every event is also kept in the ledger
+session_id = None
+ledger = None
+store = None  # EncodingStore: names and encodings, id = row number
+gallery = None  # nearest-neighbor index over store.vectors, same row order
+bootstrap = None
+enroll_lock = threading.Lock()  # keeps store and gallery rows in the same order
 is_capturing = False
 
 # Logging
@@ -34,78 +52,203 @@ logger = logging.getLogger("FaceAttendanceServer")
 
 # Folders
 KNOWN_FACES_DIR = "known_faces"
-ENCODINGS_FILE = "encodings.pkl"
+ENCODINGS_FILE = "encodings.pkl"  # legacy pickle, migrated into ENCODING_STORE_DIR on first start
+ENCODING_STORE_DIR = "encoding_store"
 ATTENDANCE_DIR = "attendance_records"
+ATTENDANCE_DB = os.path.join(ATTENDANCE_DIR, "attendance.db")
+INDEX_FILE = "encodings.index.npz"
+MATCH_TOLERANCE = 0.4
+DUPLICATE_DISTANCE = 0.1  # encodings this close come from the same picture
+MAX_BATCH_IMAGES = 5000
+
+# Gallery index: "exact" scans every encoding, "ivf" only the GALLERY_NPROBE closest partitions
+GALLERY_INDEX = os.environ.get("GALLERY_INDEX", "exact")
+GALLERY_OPTIONS = {
+    "nlist": int(os.environ["GALLERY_NLIST"]) if os.environ.get("GALLERY_NLIST") else None,
+    "nprobe": int(os.environ.get("GALLERY_NPROBE", 8)),
+} if GALLERY_INDEX == "ivf" else {}
+
+# Processes encoding known_faces/ at startup (default: one per CPU)
+BOOTSTRAP_WORKERS = int(os.environ["BOOTSTRAP_WORKERS"]) if os.environ.get("BOOTSTRAP_WORKERS") else None
+
+# Attendance capture: frames processed per session, processing rate and detection downscale
+CAPTURE_FRAME_LIMIT = int(os.environ.get("CAPTURE_FRAME_LIMIT", 100))
+CAPTURE_TARGET_FPS = float(os.environ.get("CAPTURE_TARGET_FPS", 10))
+DETECTION_SCALE = float(os.environ.get("DETECTION_SCALE", 0.5))
+
+# Default frame source ("camera", "camera:<index>", "video:<path>" or "images:<path>");
+# video and image paths are relative to REPLAY_DIR
+CAPTURE_SOURCE = os.environ.get("CAPTURE_SOURCE", "camera")
+REPLAY_DIR = os.environ.get("REPLAY_DIR", "replays")
 os.makedirs(KNOWN_FACES_DIR, exist_ok=True)
 os.makedirs(ATTENDANCE_DIR, exist_ok=True)
 
 # --- Utility functions --- #
 
 def load_encodings():
-    global data
-    if not os.path.exists(ENCODINGS_FILE):
-        logger.info("No encodings found. Creating one...")
-        known_encodings, known_names = [], []
-        for filename in os.listdir(KNOWN_FACES_DIR):
-            if filename.endswith((".jpg", ".jpeg", ".png")):
-                path = os.path.join(KNOWN_FACES_DIR, filename)
-                image = face_recognition.load_image_file(path)
-                encoding = face_recognition.face_encodings(image)
-                if encoding:
-                    known_encodings.append(encoding[0])
-                    known_names.append(os.path.splitext(filename)[0])
-                    logger.info(f"Encoded {filename}")
-        if known_encodings:
-            data = {"encodings": known_encodings, "names": known_names}
-            with open(ENCODINGS_FILE, "wb") as f:
-                pickle.dump(data, f)
-            logger.info(f"Saved {len(known_names)} encodings")
-        else:
-            data = {"encodings": [], "names": []}
-            logger.warning("No valid faces found.")
+    global store, gallery
+    if os.path.exists(os.path.join(ENCODING_STORE_DIR, "manifest.json")):
+        store = EncodingStore(ENCODING_STORE_DIR)
+        logger.info(f"Loaded {len(store)} encodings")
+    elif os.path.exists(ENCODINGS_FILE):
+        store = migrate_pickle(ENCODINGS_FILE, ENCODING_STORE_DIR)
+        logger.info(f"Migrated {len(store)} encodings from {ENCODINGS_FILE} to {ENCODING_STORE_DIR}")
     else:
-        with open(ENCODINGS_FILE, "rb") as f:
-            data = pickle.load(f)
-        logger.info(f"Loaded {len(data['names'])} encodings")
-
-def recognize_faces(frame):
-    global attendance
-    if data is None or not data.get("encodings"):
-        return
-
-    rgb_img = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    face_locations = face_recognition.face_locations(rgb_img)
-    face_encodings = face_recognition.face_encodings(rgb_img, face_locations)
-
-    for face_encoding in face_encodings:
-        matches = face_recognition.compare_faces(data["encodings"], face_encoding, tolerance=0.4)
-        face_distances = face_recognition.face_distance(data["encodings"], face_encoding)
-        name = "Unknown"
-        mark = "A"
-        if len(face_distances) > 0:
-            best_match_index = np.argmin(face_distances)
-            if matches[best_match_index] and face_distances[best_match_index] < 0.4:
-                name = data["names"][best_match_index]
-                mark = "P"
-        if name not in attendance:
-            attendance[name] = mark
-            logger.info(f"Recognized: {name} - {mark}")
-
-def save_attendance_excel():
+        logger.info("No encodings found. They will be created from known_faces in the background")
+        store = EncodingStore(ENCODING_STORE_DIR)
+    gallery = load_gallery(store.vectors)
+    gallery.remove(store.removed)
+
+def start_bootstrap():
+    """Encode new or changed images in known_faces while the server is already serving"""
+    global bootstrap
+    bootstrap = GalleryBootstrap(KNOWN_FACES_DIR, store, enroll, on_finish=save_gallery, workers=BOOTSTRAP_WORKERS)
+    bootstrap.start()
+
+def enroll(names, vectors, sources=None, files=None, replace=()):
+    """Append faces to the encoding store and the gallery index.
+
+    Faces already stored for the same files in known_faces/ are retired,
+    together with the ids in ``replace``, in the same store commit.
+    """
+    with enroll_lock:
+        replace = set(replace).union(store.ids_for_files(files)) if files else set(replace)
+        first_id = store.append(names, vectors, sources, files, replace)
+        if len(names):
+            gallery.add(vectors)
+        gallery.remove(replace)
+    return first_id
+
+def save_gallery():
+    with enroll_lock:
+        gallery.save(INDEX_FILE)
+
+def encode_upload(image_bytes):
+    """Encoding of the first face in an uploaded image, or None"""
+    image = face_recognition.load_image_file(io.BytesIO(image_bytes))
+    encodings = face_recognition.face_encodings(image)
+    return encodings[0] if encodings else None
+
+def read_zip_images(archive_bytes):
+    """(filename, bytes) of every image in a zip archive"""
+    with zipfile.ZipFile(io.BytesIO(archive_bytes)) as archive:
+        return [
+            (info.filename, archive.read(info))
+            for info in archive.infolist()
+            if not info.is_dir() and info.filename.lower().endswith(IMAGE_EXTENSIONS)
+        ]
+
+def commit_enrollment(images, encodings):
+    """Drop duplicates, save the images and enroll the rest of the batch with one store append.
+
+    Images are saved to known_faces/ under their base name, so once an
+    image is saved, later images of the batch with the same name are
+    rejected. Returns a result dict per image.
+    """
+    results, names, vectors, sources, files = [], [], [], [], []
+    seen_files = set()
+    for (filename, image_bytes), encoding in zip(images, encodings):
+        basename = os.path.basename(filename)
+        name = os.path.splitext(basename)[0]
+        result = {"file": filename, "name": name}
+        results.append(result)
+        if basename.lower() in seen_files:
+            result.update({"status": "error", "detail": f"Another image in this batch is also named {basename}"})
+            continue
+        if isinstance(encoding, Exception):
+            result.update({"status": "error", "detail": str(encoding)})
+            continue
+        if encoding is None:
+            result.update({"status": "no_face", "detail": "No face detected in image"})
+            continue
+
+        # Near-identical to an enrolled face or to an earlier image of this batch
+        rows, _ = gallery.search([encoding], DUPLICATE_DISTANCE)
+        duplicate_of = store.names[rows[0]] if rows[0] >= 0 else None
+        if duplicate_of is None and vectors:
+            distances = np.linalg.norm(np.asarray(vectors, dtype=np.float32) - encoding, axis=1)
+            if distances.min() < DUPLICATE_DISTANCE:
+                duplicate_of = names[int(distances.argmin())]
+        if duplicate_of is not None:
+            result.update({"status": "duplicate", "detail": f"Same face as '{duplicate_of}'"})
+            continue
+
+        with open(os.path.join(KNOWN_FACES_DIR, basename), "wb") as f:
+            f.write(image_bytes)
+        seen_files.add(basename.lower())
+        names.append(name)
+        vectors.append(encoding)
+        sources.append(hashlib.sha256(image_bytes).hexdigest())
+        files.append(basename)
+        result["status"] = "enrolled"
+
+    if names:
+        enroll(names, vectors, sources, files)
+        save_gallery()
+    return results
+
+def load_gallery(encodings):
+    """Open the saved gallery index, rebuilding it when it does not match the encodings"""
+    index = create_index(GALLERY_INDEX, **GALLERY_OPTIONS)
+    if os.path.exists(INDEX_FILE) and index.load(INDEX_FILE, encodings):
+        logger.info(f"Loaded {GALLERY_INDEX} gallery index ({len(index)} encodings)")
+        return index
+    index = create_index(GALLERY_INDEX, **GALLERY_OPTIONS)
+    index.build(encodings)
+    index.save(INDEX_FILE)
+    logger.info(f"Built {GALLERY_INDEX} gallery index ({len(index)} encodings)")
+    return index
+
+def identify_faces(rgb_img, face_locations):
+    """(known name or None, distance) for each face box in a full-resolution RGB image"""
+    if store is None or not len(store) or gallery is None or not face_locations:
+        return [(None, None)] * len(face_locations)
+    with stage("face_encode"):
+        face_encodings = face_recognition.face_encodings(rgb_img, face_locations)
+    with stage("face_match"):
+        best_matches, distances = gallery.search(face_encodings, MATCH_TOLERANCE)
+    return [
+        (store.names[index] if index >= 0 else None, float(distance))
+        for index, distance in zip(best_matches, distances)
+    ]
+
+def mark_attendance(name, distance=None):
+    """Record a recognition in the ledger and in the current session's attendance"""
     global attendance
-    today = datetime.date.today().strftime("%Y-%m-%d")
-    file_path = os.path.join(ATTENDANCE_DIR, f"attendance_{today}.xlsx")
-    df = pd.DataFrame(list(attendance.items()), columns=["Name", "Status"])
-    df.to_excel(file_path, index=False)
-    logger.info(f"Attendance saved to {file_path}")
-    return file_path
-
-def capture_attendance_frames(frame_limit=50, delay=0.1):
-    """Capture frames from camera and update attendance & progress in real-time"""
+    name, mark = (name, "P") if name is not None else ("Unknown", "A")
+    ledger.record(session_id or "adhoc", name, mark, distance=distance)
+    if name not in attendance:
+        attendance[name] = mark
+        broadcaster.publish({"type": "attendance", "name": name, "status": mark})
+        logger.info(f"Recognized: {name} - {mark}")
+
+def update_progress(changes):
+    """Update current_process and broadcast only the keys that changed"""
+    delta = {key: value for key, value in changes.items() if current_process.get(key) != value}
+    current_process.update(changes)
+    if delta:
+        broadcaster.publish({"type": "progress", **delta})
+
+def state_snapshot():
+    return {"progress": dict(current_process), "attendance": dict(attendance)}
+
+broadcaster = EventBroadcaster(state_snapshot)
+
+def capture_attendance_frames(source=CAPTURE_SOURCE, frame_limit=CAPTURE_FRAME_LIMIT, target_fps=CAPTURE_TARGET_FPS):
+    """Capture frames from the camera (or a recording) and update attendance & progress in real-time"""
     global is_capturing, attendance, current_process
-    cap = cv2.VideoCapture(0, cv2.CAP_DSHOW)
+    try:
+        cap = open_source(source, REPLAY_DIR)
+    except FrameSourceError as e:
+        logger.error(f"Cannot open frame source {source}: {e}")
+        update_progress({"status": "error", "progress": 0, "message": str(e)})
+        is_capturing = False
+        return
+    grabber = FrameGrabber(cap, drop_stale=cap.live).start()
+    processor = FrameProcessor(identify_faces, detection_scale=DETECTION_SCALE)
+    interval = 1.0 / target_fps if target_fps else 0.0
     frame_count = 0
-    current_process.update({
+    update_progress({
         "status": "processing",
         "progress": 0,
         "message": "Starting attendance capture",
@@ -113,41 +256,48 @@ def capture_attendance_frames(frame_limit=50, delay=0.1):
     })
 
     try:
+        next_frame = time.monotonic()
         while frame_count < frame_limit and is_capturing:
-            ret, frame = cap.read()
-            if not ret:
-                logger.warning("Failed to read frame")
+            frame = grabber.read(timeout=5.0)
+            if frame is None:
+                if cap.live:
+                    logger.warning("Failed to read frame")
+                else:
+                    logger.info(f"Reached the end of {source}")
                 break
 
-            recognize_faces(frame)
+            processor.process(frame)
+            for track in processor.last_identified:
+                # Unknown faces are retried while in view; log them once per track
+                if track.name is not None or track.attempts == 1:
+                    mark_attendance(track.name, track.distance)
             frame_count += 1
 
-            # ✅ Stop early if at least one person recognized
-            if any(v == "P" for v in attendance.values()):
-                logger.info("Face recognized — stopping capture early")
-                break
-
             # Update progress
-            current_process.update({
+            update_progress({
                 "progress": int((frame_count / frame_limit) * 100),
                 "message": f"Captured {frame_count}/{frame_limit} frames"
             })
-            time.sleep(delay)
 
-        # ✅ Save attendance once (and not repeatedly)
-        file_path = save_attendance_excel()
-        current_process.update({
+            # Pace to the target FPS; a slow frame is not made up for by skipping the wait later
+            next_frame = max(next_frame + interval, time.monotonic())
+            time.sleep(max(0.0, next_frame - time.monotonic()))
+
+        # Events are already in the ledger; the report is generated on demand
+        update_progress({
             "status": "completed",
             "progress": 100,
             "message": "Attendance capture completed",
-            "saved_file": file_path
+            "report": f"/attendance/report?session={session_id}"
         })
 
     finally:
+        grabber.stop()
+        if grabber.dropped:
+            logger.info(f"Dropped {grabber.dropped} stale frames")
         cap.release()
-        cv2.destroyAllWindows()
         is_capturing = False
-        logger.info("Camera released and attendance process ended.")
+        logger.info(f"Frame source {source} released and attendance process ended.")
 
 
 # --- FastAPI App --- #
@@ -157,9 +307,14 @@ from contextlib import asynccontextmanager
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Loading face encodings...")
+    global ledger
+    broadcaster.bind(asyncio.get_running_loop())
+    ledger = AttendanceLedger(ATTENDANCE_DB)
     load_encodings()
+    start_bootstrap()
     yield
     logger.info("Shutting down server...")
+    ledger.close()
 
 app = FastAPI(lifespan=lifespan, title="Face Recognition Attendance API")
 app.add_middleware(
@@ -169,6 +324,44 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# --- Request metrics --- #
+
+def route_label(request: Request):
+    """Path template of the matching route, so /user/1 and /user/2 share a series"""
+    for route in request.app.router.routes:
+        match, _ = route.matches(request.scope)
+        if match == Match.FULL:
+            return getattr(route, "path", "unmatched")
+    return "unmatched"
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    route = route_label(request)
+    start = time.perf_counter()
+    status = 500
+    REQUESTS_IN_PROGRESS.inc(method=request.method, route=route)
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        REQUESTS_IN_PROGRESS.dec(method=request.method, route=route)
+        REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method, route=route, status=status)
+
+@app.get("/metrics")
+def get_metrics():
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.get("/debug/profile")
+def get_profile(seconds: float = 10):
+    """Sample every thread's stack for a while (opt-in with ENABLE_PROFILER=1)"""
+    if not PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiler is disabled, set ENABLE_PROFILER=1")
+    stacks = PROFILER.profile(min(seconds, MAX_PROFILE_SECONDS))
+    if stacks is None:
+        return JSONResponse({"status": "error", "message": "A profile is already running"}, status_code=409)
+    return PlainTextResponse(stacks)
+
 # --- Endpoints --- #
 
 @app.get("/")
@@ -176,14 +369,23 @@ def read_root():
     return {"status": "success", "message": "Face Recognition Attendance System is running"}
 
 @app.get("/start-attendance")
-async def start_attendance(background_tasks: BackgroundTasks):
-    global is_capturing, attendance
+async def start_attendance(background_tasks: BackgroundTasks, source: str = None):
+    """Start a capture session from ``source`` (default CAPTURE_SOURCE), e.g. camera or video:class.mp4"""
+    global is_capturing, attendance, session_id
     if is_capturing:
         return {"status": "error", "message": "Attendance capture already running"}
+    source = source or CAPTURE_SOURCE
+    try:
+        parse_source(source, REPLAY_DIR)
+    except FrameSourceError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     attendance = {}
+    session_id = uuid.uuid4().hex
+    broadcaster.publish({"type": "reset"})
     is_capturing = True
-    background_tasks.add_task(capture_attendance_frames)
-    return {"status": "success", "message": "Attendance capture started in background"}
+    background_tasks.add_task(capture_attendance_frames, source)
+    return {"status": "success", "message": "Attendance capture started in background",
+            "session": session_id, "source": source}
 
 @app.get("/stop-attendance")
 def stop_attendance():
@@ -198,40 +400,96 @@ def get_attendance():
     global attendance
     return {"status": "success", "attendance": attendance or {}}
 
+@app.get("/attendance/events")
+def get_attendance_events(date: str = None, name: str = None, session: str = None, limit: int = 1000):
+    """Raw ledger events, filtered by day (YYYY-MM-DD), person and/or session"""
+    ledger.flush()
+    events = ledger.events(day=date, name=name, session_id=session, limit=limit)
+    return {"status": "success", "events": events}
+
+@app.get("/attendance/report")
+def get_attendance_report(date: str = None, session: str = None, format: str = "csv"):
+    """Per-person attendance report for a day (default today) or a session, as CSV or Excel"""
+    if format not in ("csv", "xlsx"):
+        raise HTTPException(status_code=400, detail="format must be csv or xlsx")
+    if date is None and session is None:
+        date = datetime.date.today().isoformat()
+    ledger.flush()
+    filename = f"attendance_{session or date}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if format == "csv":
+        return StreamingResponse(ledger.stream_csv(date, session), media_type="text/csv", headers=headers)
+    return Response(
+        ledger.excel_report(date, session),
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers=headers
+    )
+
 @app.get("/reset-attendance")
 def reset_attendance():
     global attendance
     attendance = {}
+    broadcaster.publish({"type": "reset"})
     return {"status": "success", "message": "Attendance reset", "attendance": attendance}
 
+@app.get("/bootstrap-status")
+def get_bootstrap_status():
+    return {"status": "success", "bootstrap": bootstrap.progress if bootstrap else {"status": "idle"}}
+
 @app.post("/add-face/")
 async def add_face(name: str, file: UploadFile = File(...)):
     """Add a new predefined face manually"""
-    file_path = os.path.join(KNOWN_FACES_DIR, f"{name}.jpg")
-
-    # Save uploaded image
-    with open(file_path, "wb") as f:
-        f.write(await file.read())
+    image_bytes = await file.read()
+    loop = asyncio.get_running_loop()
 
-    # Encode and save
-    image = face_recognition.load_image_file(file_path)
-    encodings = face_recognition.face_encodings(image)
-    if not encodings:
-        os.remove(file_path)
+    # Encode off the event loop
+    encoding = await loop.run_in_executor(executor, encode_upload, image_bytes)
+    if encoding is None:
         raise HTTPException(status_code=400, detail="No face detected in image")
 
-    # Update existing encodings.pkl
-    with open(ENCODINGS_FILE, "rb") as f:
-        data = pickle.load(f)
-    data["encodings"].append(encodings[0])
-    data["names"].append(name)
-
-    with open(ENCODINGS_FILE, "wb") as f:
-        pickle.dump(data, f)
+    def save():
+        with open(os.path.join(KNOWN_FACES_DIR, f"{name}.jpg"), "wb") as f:
+            f.write(image_bytes)
+        # Append to the encoding store and make the face searchable
+        enroll([name], [encoding], [hashlib.sha256(image_bytes).hexdigest()], [f"{name}.jpg"])
+        save_gallery()
 
+    await loop.run_in_executor(executor, save)
     logger.info(f"Added predefined face: {name}")
     return {"status": "success", "message": f"Face for '{name}' added successfully"}
 
+@app.post("/add-faces/")
+async def add_faces(files: list[UploadFile] = File(...)):
+    """Enroll a batch of faces: images named <name>.jpg/.jpeg/.png, or zip archives of them"""
+    loop = asyncio.get_running_loop()
+    images = []
+    for upload in files:
+        if not upload.filename:
+            raise HTTPException(status_code=400, detail="Every uploaded file needs a filename")
+        content = await upload.read()
+        if upload.filename.lower().endswith(".zip"):
+            try:
+                images.extend(await loop.run_in_executor(executor, read_zip_images, content))
+            except zipfile.BadZipFile:
+                raise HTTPException(status_code=400, detail=f"{upload.filename} is not a valid zip archive")
+        elif upload.filename.lower().endswith(IMAGE_EXTENSIONS):
+            images.append((upload.filename, content))
+    if not images:
+        raise HTTPException(status_code=400, detail="No images found in upload")
+    if len(images) > MAX_BATCH_IMAGES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH_IMAGES} images per batch")
+
+    # Decode and encode in the thread pool, then commit the whole batch at once
+    encodings = await asyncio.gather(
+        *(loop.run_in_executor(executor, encode_upload, image_bytes) for _, image_bytes in images),
+        return_exceptions=True
+    )
+    results = await loop.run_in_executor(executor, commit_enrollment, images, encodings)
+
+    enrolled = sum(result["status"] == "enrolled" for result in results)
+    logger.info(f"Enrolled {enrolled} of {len(results)} uploaded faces")
+    return {"status": "success", "enrolled": enrolled, "total": len(results), "results": results}
+
 
 @app.post("/manual-mark")
 def manual_mark(request: dict):
@@ -243,19 +501,25 @@ def manual_mark(request: dict):
     if status not in ["P", "A"]:
         status = "A"
     attendance[name] = status
+    ledger.record(session_id or "manual", name, status, source="manual")
+    broadcaster.publish({"type": "attendance", "name": name, "status": status})
     return {"status": "success", "message": f"{name} marked {status}", "attendance": attendance or {}}
 
 # --- WebSocket for real-time progress --- #
 
 @app.websocket("/ws/attendance")
 async def websocket_attendance(websocket: WebSocket):
+    """Full state on connect, then progress/attendance/reset events as they happen"""
     await websocket.accept()
+    subscriber = broadcaster.subscribe()
     try:
+        await websocket.send_json({"type": "snapshot", **state_snapshot()})
         while True:
-            await asyncio.sleep(0.5)  # update twice per second
-            await websocket.send_json(current_process)
+            await websocket.send_json(await subscriber.get())
     except WebSocketDisconnect:
         logger.info("Client disconnected from WebSocket")
+    finally:
+        broadcaster.unsubscribe(subscriber)
 
 # --- Main --- #
 
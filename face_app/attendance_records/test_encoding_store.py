@@ -0,0 +1,83 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from encoding_store import (ENCODING_DIM, MANIFEST_FILE, NAMES_FILE, VECTORS_FILE, EncodingStore,
+                            StoreError)
+
+
+def random_vectors(count, seed):
+    return np.random.default_rng(seed).normal(size=(count, ENCODING_DIM)).astype(np.float32)
+
+
+def assert_store_holds(store, names, vectors, removed=()):
+    assert len(store) == len(names)
+    assert store.names == names
+    np.testing.assert_array_equal(store.vectors, vectors)
+    assert store.removed == set(removed)
+
+
+def tear_tail(directory, rows, names_bytes):
+    """Leave what an append interrupted before its manifest commit would leave"""
+    with open(os.path.join(directory, VECTORS_FILE), "ab") as f:
+        f.write(random_vectors(rows, 99).tobytes())
+        f.write(b"\x01\x02\x03")  # and a partial row
+    with open(os.path.join(directory, NAMES_FILE), "ab") as f:
+        f.write(b'{"name": "torn", "source": null, "file": null}\n'[:names_bytes])
+
+
+def test_reopen_reads_what_was_committed(tmp_path):
+    directory = str(tmp_path / "store")
+    store = EncodingStore(directory)
+    vectors = random_vectors(5, 0)
+    store.append(["a", "b", "c"], vectors[:3], ["s1", "s2", "s3"], ["a.jpg", "b.jpg", "c.jpg"])
+    store.append(["d", "e"], vectors[3:], replace=[1])
+
+    reopened = EncodingStore(directory)
+    assert_store_holds(reopened, ["a", "b", "c", "d", "e"], vectors, removed=[1])
+    assert reopened.sources == ["s1", "s2", "s3", None, None]
+    assert reopened.files == ["a.jpg", "b.jpg", "c.jpg", None, None]
+    assert reopened.live_ids() == [0, 2, 3, 4]
+
+
+@pytest.mark.parametrize("rows, names_bytes", [(0, 10), (1, 0), (2, 47), (3, 20)])
+def test_torn_tail_is_ignored_and_cut_off_by_next_append(tmp_path, rows, names_bytes):
+    directory = str(tmp_path / "store")
+    vectors = random_vectors(4, 1)
+    EncodingStore(directory).append(["a", "b"], vectors[:2])
+    tear_tail(directory, rows, names_bytes)
+
+    # Everything past the committed end is invisible...
+    reopened = EncodingStore(directory)
+    assert_store_holds(reopened, ["a", "b"], vectors[:2])
+
+    # ...and the next append overwrites it
+    reopened.append(["c", "d"], vectors[2:], replace=[0])
+    assert_store_holds(reopened, ["a", "b", "c", "d"], vectors, removed=[0])
+    assert_store_holds(EncodingStore(directory), ["a", "b", "c", "d"], vectors, removed=[0])
+    assert os.path.getsize(os.path.join(directory, VECTORS_FILE)) == vectors.nbytes
+
+
+def test_torn_tail_before_the_first_commit(tmp_path):
+    directory = str(tmp_path / "store")
+    os.makedirs(directory)
+    tear_tail(directory, 2, 30)
+
+    store = EncodingStore(directory)
+    assert len(store) == 0
+    vectors = random_vectors(1, 2)
+    store.append(["a"], vectors)
+    assert_store_holds(EncodingStore(directory), ["a"], vectors)
+
+
+def test_names_shorter_than_manifest_is_an_error(tmp_path):
+    directory = str(tmp_path / "store")
+    EncodingStore(directory).append(["a", "b"], random_vectors(2, 3))
+    with open(os.path.join(directory, MANIFEST_FILE)) as f:
+        manifest = json.load(f)
+    with open(os.path.join(directory, NAMES_FILE), "r+b") as f:
+        f.truncate(manifest["names_bytes"] // 2)
+    with pytest.raises(StoreError):
+        EncodingStore(directory)
@@ -0,0 +1,134 @@
+import numpy as np
+import pytest
+
+from encoding_store import ENCODING_DIM, EncodingStore
+from face_bootstrap import GalleryBootstrap, file_digest, pending_images
+
+
+@pytest.fixture
+def faces_dir(tmp_path):
+    directory = tmp_path / "known_faces"
+    directory.mkdir()
+    return directory
+
+
+@pytest.fixture
+def store(tmp_path):
+    return EncodingStore(str(tmp_path / "store"))
+
+
+def write_image(directory, filename, content):
+    path = directory / filename
+    path.write_bytes(content)
+    return path
+
+
+def encode_folder(directory, store, filenames):
+    """Store one random encoding per file, as a completed bootstrap would"""
+    rng = np.random.default_rng(len(store))
+    paths = [directory / filename for filename in filenames]
+    store.append([path.stem for path in paths], rng.normal(size=(len(paths), ENCODING_DIM)),
+                 [file_digest(path) for path in paths], filenames)
+
+
+def enroll_into(store):
+    def enroll(names, vectors, sources=None, files=None, replace=()):
+        store.append(names, vectors, sources, files, set(replace).union(store.ids_for_files(files or ())))
+    return enroll
+
+
+def test_unchanged_folder_has_nothing_to_do(faces_dir, store):
+    write_image(faces_dir, "alice.jpg", b"alice")
+    write_image(faces_dir, "bob.jpg", b"bob")
+    encode_folder(faces_dir, store, ["alice.jpg", "bob.jpg"])
+    assert pending_images(str(faces_dir), store) == ([], [], [])
+
+
+def test_rename_moves_the_face(faces_dir, store):
+    write_image(faces_dir, "alice.jpg", b"alice")
+    encode_folder(faces_dir, store, ["alice.jpg"])
+    (faces_dir / "alice.jpg").rename(faces_dir / "alicia.jpg")
+
+    pending, moved, deleted = pending_images(str(faces_dir), store)
+    assert pending == []
+    assert moved == [(0, str(faces_dir / "alicia.jpg"), "alicia", store.sources[0])]
+    assert deleted == []
+
+
+def test_copy_then_delete_moves_the_face_to_the_copy(faces_dir, store):
+    write_image(faces_dir, "alice.jpg", b"alice")
+    encode_folder(faces_dir, store, ["alice.jpg"])
+    write_image(faces_dir, "alice_copy.jpg", b"alice")
+    # The copy alone is skipped while the original is still there
+    assert pending_images(str(faces_dir), store) == ([], [], [])
+
+    (faces_dir / "alice.jpg").unlink()
+    pending, moved, deleted = pending_images(str(faces_dir), store)
+    assert pending == []
+    assert [(face_id, name) for face_id, _, name, _ in moved] == [(0, "alice_copy")]
+    assert deleted == []
+
+
+def test_changed_file_is_encoded_again(faces_dir, store):
+    write_image(faces_dir, "alice.jpg", b"alice")
+    encode_folder(faces_dir, store, ["alice.jpg"])
+    write_image(faces_dir, "alice.jpg", b"alice, new photo")
+
+    pending, moved, deleted = pending_images(str(faces_dir), store)
+    assert pending == [(str(faces_dir / "alice.jpg"), "alice", file_digest(faces_dir / "alice.jpg"))]
+    assert (moved, deleted) == ([], [])
+
+
+def test_changed_file_leaves_its_old_content_to_a_copy(faces_dir, store):
+    write_image(faces_dir, "alice.jpg", b"alice")
+    encode_folder(faces_dir, store, ["alice.jpg"])
+    write_image(faces_dir, "alice_copy.jpg", b"alice")
+    write_image(faces_dir, "alice.jpg", b"alice, new photo")
+
+    pending, moved, deleted = pending_images(str(faces_dir), store)
+    assert sorted(name for _, name, _ in pending) == ["alice", "alice_copy"]
+    assert (moved, deleted) == ([], [])
+
+
+def test_deleted_file_is_retired(faces_dir, store):
+    write_image(faces_dir, "alice.jpg", b"alice")
+    write_image(faces_dir, "bob.jpg", b"bob")
+    encode_folder(faces_dir, store, ["alice.jpg", "bob.jpg"])
+    (faces_dir / "bob.jpg").unlink()
+    assert pending_images(str(faces_dir), store) == ([], [], [1])
+
+
+def test_faces_without_a_file_are_kept(faces_dir, store):
+    store.append(["carol"], np.zeros((1, ENCODING_DIM)))
+    assert pending_images(str(faces_dir), store) == ([], [], [])
+
+
+def test_run_moves_renamed_face_without_encoding(faces_dir, store):
+    write_image(faces_dir, "alice.jpg", b"alice")
+    encode_folder(faces_dir, store, ["alice.jpg"])
+    (faces_dir / "alice.jpg").rename(faces_dir / "alicia.jpg")
+
+    bootstrap = GalleryBootstrap(str(faces_dir), store, enroll_into(store))
+    bootstrap.run()
+    assert bootstrap.progress["status"] == "completed"
+    assert bootstrap.progress["moved"] == 1
+    assert store.live_ids() == [1]
+    assert (store.names[1], store.files[1]) == ("alicia", "alicia.jpg")
+    np.testing.assert_array_equal(store.vectors[1], store.vectors[0])
+    assert pending_images(str(faces_dir), store) == ([], [], [])
+
+
+def test_run_reports_failure_and_still_saves(faces_dir, store):
+    write_image(faces_dir, "alice.jpg", b"alice")
+    encode_folder(faces_dir, store, ["alice.jpg"])
+    (faces_dir / "alice.jpg").unlink()
+    saved = []
+
+    def enroll(*args):
+        raise OSError("disk full")
+
+    bootstrap = GalleryBootstrap(str(faces_dir), store, enroll, on_finish=lambda: saved.append(True))
+    bootstrap.run()
+    assert bootstrap.progress["status"] == "failed"
+    assert bootstrap.progress["error"] == "disk full"
+    assert saved == [True]
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+import gallery_index
+from gallery_index import ENCODING_DIM, ExactIndex, IVFIndex
+
+
+@pytest.fixture(autouse=True)
+def small_training_size(monkeypatch):
+    monkeypatch.setattr(gallery_index, "MIN_TRAIN_SIZE", 64)
+
+
+def random_vectors(count, seed):
+    vectors = np.random.default_rng(seed).normal(size=(count, ENCODING_DIM)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_ivf_retrains_as_the_gallery_grows():
+    index = IVFIndex()
+    index.add(random_vectors(32, 0))
+    assert index._centroids is None
+
+    index.add(random_vectors(32, 1))
+    assert index._trained_size == 64
+    nlist = len(index._centroids)
+
+    # Additions join the existing partitions until the gallery has grown RETRAIN_GROWTH times over
+    index.add(random_vectors(64 * gallery_index.RETRAIN_GROWTH - 65, 2))
+    assert index._trained_size == 64
+    index.add(random_vectors(1, 3))
+    assert index._trained_size == 64 * gallery_index.RETRAIN_GROWTH
+    assert len(index._centroids) > nlist
+    assert sorted(np.concatenate(index._lists)) == list(range(len(index)))
+
+
+def test_ivf_search_with_all_partitions_matches_exact():
+    vectors = random_vectors(500, 4)
+    queries = vectors[::7] + 0.01
+    ivf = IVFIndex(nprobe=10 ** 6)
+    exact = ExactIndex()
+    for start in range(0, len(vectors), 50):
+        ivf.add(vectors[start:start + 50])
+        exact.add(vectors[start:start + 50])
+    rows, _ = ivf.search(queries, 0.4)
+    expected, _ = exact.search(queries, 0.4)
+    np.testing.assert_array_equal(rows, expected)
+
+
+def test_loaded_ivf_keeps_partitions_until_outgrown(tmp_path):
+    path = str(tmp_path / "gallery.npz")
+    vectors = random_vectors(100, 5)
+    index = IVFIndex()
+    index.build(vectors)
+    index.save(path)
+
+    loaded = IVFIndex()
+    assert loaded.load(path, vectors)
+    assert loaded._trained_size == 100
+    np.testing.assert_array_equal(loaded._centroids, index._centroids)
+
+
+def test_loaded_ivf_retrains_when_saved_before_trained_size_was_recorded(tmp_path):
+    path = str(tmp_path / "gallery.npz")
+    vectors = random_vectors(100, 6)
+    index = IVFIndex()
+    index.build(vectors)
+    state = dict(index._state(), kind=np.array("ivf"), count=np.array(len(vectors)))
+    del state["trained_size"]
+    with open(path, "wb") as f:
+        np.savez(f, **state)
+
+    loaded = IVFIndex()
+    assert loaded.load(path, vectors)
+    assert loaded._trained_size == 100
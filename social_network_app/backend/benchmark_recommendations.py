@@ -0,0 +1,208 @@
+"""Benchmark the social network hot paths on a synthetic graph.
+
+Usage:
+    python benchmark_recommendations.py --edges 100000 [--edges-per-user 10] [--queries 200]
+                                        [--backend csr] [--out results.json]
+                                        [--baseline previous.json --tolerance 0.2]
+
+A Barabási–Albert (preferential attachment) graph is generated into a
+throwaway SQLite file and the script measures: bulk insert throughput,
+startup load time and memory (from the database and from a snapshot),
+get_recommendations latency at degree 2/3/4 and get_network_data time.
+Results are printed as JSON; with --baseline, timings more than
+--tolerance slower than the baseline are reported and the exit code is 1.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from graph_snapshot import build_snapshot
+from social_db import SocialNetworkDB
+
+
+def barabasi_albert_edges(num_users, edges_per_user, seed=None):
+    """Yield the edges of a Barabási–Albert graph over users 0..num_users-1"""
+    rng = random.Random(seed)
+    m = edges_per_user
+    # Every edge endpoint is appended here, so picking uniformly from it picks
+    # users proportionally to their degree
+    endpoints = np.zeros(2 * m * num_users, dtype=np.int64)
+    size = 0
+    for user in range(m + 1):
+        for other in range(user):
+            yield user, other
+            endpoints[size:size + 2] = (user, other)
+            size += 2
+    for user in range(m + 1, num_users):
+        targets = set()
+        while len(targets) < m:
+            targets.add(int(endpoints[rng.randrange(size)]))
+        for target in targets:
+            yield user, target
+            endpoints[size:size + 2] = (user, target)
+            size += 2
+
+
+def percentile(samples, p):
+    return float(np.percentile(samples, p)) if samples else None
+
+
+def measure_load(db_path, backend, snapshot_path=None):
+    """Startup time and memory of loading the graph.
+
+    tracemalloc slows allocation-heavy loads down a lot, so the time comes
+    from an untraced load and the memory from a second, traced one.
+    """
+    def load():
+        return SocialNetworkDB(db_path, graph_backend=backend, cache_size=0, snapshot_path=snapshot_path)
+
+    tracemalloc.start()
+    traced = load()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    traced.pool.close_all()
+    del traced
+
+    start = time.perf_counter()
+    db = load()
+    elapsed = time.perf_counter() - start
+    return db, {
+        'seconds': elapsed,
+        'retained_bytes': current,
+        'peak_bytes': peak,
+        'adjacency_bytes': getattr(db.graph, 'nbytes', None),
+    }
+
+
+def measure_recommendations(db, user_ids, degree):
+    latencies = []
+    for user_id in user_ids:
+        start = time.perf_counter()
+        db.get_recommendations(user_id, degree)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return {
+        'queries': len(latencies),
+        'p50_ms': percentile(latencies, 50),
+        'p99_ms': percentile(latencies, 99),
+        'max_ms': max(latencies) if latencies else None,
+    }
+
+
+def run(num_edges, edges_per_user, queries, backend, seed, degrees=(2, 3, 4), network=True):
+    num_users = max(edges_per_user + 1, num_edges // edges_per_user)
+    workdir = tempfile.mkdtemp(prefix='social-bench-')
+    db_path = os.path.join(workdir, 'bench.db')
+    snapshot_path = os.path.join(workdir, 'bench.snapshot')
+    results = {
+        'params': {
+            'edges': num_edges, 'users': num_users, 'edges_per_user': edges_per_user,
+            'queries': queries, 'backend': backend, 'seed': seed,
+        },
+        'environment': {'python': platform.python_version(), 'machine': platform.machine()},
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+    try:
+        # Users go straight into SQLite; the benchmarked bulk path handles the edges
+        db = SocialNetworkDB(db_path, graph_backend=backend, cache_size=0)
+        first_id = db.last_user_id + 1
+        with db.pool.transaction() as cursor:
+            cursor.executemany('INSERT INTO users (name) VALUES (?)',
+                               ((f"user_{i}",) for i in range(num_users)))
+        db.sync_from_db(force=True)
+
+        edges = ((first_id + u, first_id + v) for u, v in barabasi_albert_edges(num_users, edges_per_user, seed))
+        start = time.perf_counter()
+        inserted = db.add_friendships_bulk(edges)['inserted']
+        elapsed = time.perf_counter() - start
+        results['bulk_insert'] = {'edges': inserted, 'seconds': elapsed, 'edges_per_second': inserted / elapsed}
+        db.pool.close_all()
+        del db
+
+        _, results['load_from_db'] = measure_load(db_path, backend)
+        start = time.perf_counter()
+        build_snapshot(db_path, snapshot_path)
+        results['snapshot_build_seconds'] = time.perf_counter() - start
+        db, results['load_from_snapshot'] = measure_load(db_path, backend, snapshot_path)
+        results['max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        sample = random.Random(seed).sample(sorted(db.users), min(queries, len(db.users)))
+        results['recommendations'] = {
+            f"degree_{degree}": measure_recommendations(db, sample, degree) for degree in degrees
+        }
+
+        if network:
+            start = time.perf_counter()
+            network_data = db.get_network_data()
+            body = json.dumps(network_data)
+            results['network_data'] = {'seconds': time.perf_counter() - start, 'bytes': len(body)}
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return results
+
+
+# percentile and find_regressions are mirrored in face_app/attendance_records/benchmark_pipeline.py,
+# so both benchmarks flag regressions the same way; change them together
+def find_regressions(results, baseline, tolerance):
+    """Timings that got slower than the baseline by more than ``tolerance`` (a fraction)"""
+    regressions = []
+
+    def walk(current, previous, path):
+        for key, value in current.items():
+            if key not in previous:
+                continue
+            if isinstance(value, dict) and isinstance(previous[key], dict):
+                walk(value, previous[key], f"{path}{key}.")
+            elif (key == 'seconds' or key.endswith('_ms')) and value and previous[key]:
+                if value > previous[key] * (1 + tolerance):
+                    regressions.append({'metric': path + key, 'baseline': previous[key], 'current': value})
+
+    walk(results, baseline, '')
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark recommendation hot paths on a synthetic graph')
+    parser.add_argument('--edges', type=int, default=10000, help='Approximate number of friendships')
+    parser.add_argument('--edges-per-user', type=int, default=10, help='Barabási–Albert attachment count')
+    parser.add_argument('--queries', type=int, default=200, help='Recommendation queries per degree')
+    parser.add_argument('--backend', default='csr', choices=('csr', 'networkx'), help='Graph backend')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--skip-network', action='store_true', help='Skip the get_network_data measurement')
+    parser.add_argument('--out', help='Also write the JSON results to this file')
+    parser.add_argument('--baseline', help='Earlier results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown vs. the baseline')
+    args = parser.parse_args(argv)
+
+    # The database logs its progress to stdout; keep stdout for the JSON results
+    with contextlib.redirect_stdout(sys.stderr):
+        results = run(args.edges, args.edges_per_user, args.queries, args.backend, args.seed,
+                      network=not args.skip_network)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            results['regressions'] = find_regressions(results, json.load(f), args.tolerance)
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(output + '\n')
+    if results.get('regressions'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Bulk friendship import.
+
+Usage:
+    python bulk_import.py edges.csv [--db social_network.db] [--batch-size 50000]
+    python bulk_import.py edges.ndjson --format ndjson
+
+CSV input has one ``user1_id,user2_id`` pair per line (an optional header
+line is skipped); NDJSON input has one ``{"user1_id": .., "user2_id": ..}``
+object per line.
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+
+from social_db import SocialNetworkDB
+
+
+class EdgeReader:
+    """Stream (user1_id, user2_id) pairs from CSV or NDJSON lines, counting malformed lines"""
+
+    def __init__(self, lines, fmt='csv'):
+        if fmt not in ('csv', 'ndjson'):
+            raise ValueError(f"Unsupported edge format: {fmt}")
+        self.lines = lines
+        self.fmt = fmt
+        self.malformed = 0
+
+    def __iter__(self):
+        return self._iter_csv() if self.fmt == 'csv' else self._iter_ndjson()
+
+    def _iter_csv(self):
+        for line_number, row in enumerate(csv.reader(self.lines)):
+            if not row:
+                continue
+            try:
+                yield int(row[0]), int(row[1])
+            except (ValueError, IndexError):
+                if line_number > 0:
+                    self.malformed += 1
+
+    def _iter_ndjson(self):
+        for line in self.lines:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                yield int(record['user1_id']), int(record['user2_id'])
+            except (ValueError, KeyError, TypeError):
+                self.malformed += 1
+
+
+def format_for(path_or_mimetype):
+    """Guess the edge format from a file name or content type"""
+    if 'json' in path_or_mimetype:
+        return 'ndjson'
+    return 'csv'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk import friendships into the social network database')
+    parser.add_argument('path', help='CSV or NDJSON edge list ("-" for stdin)')
+    parser.add_argument('--db', default='social_network.db', help='SQLite database file')
+    parser.add_argument('--format', choices=('csv', 'ndjson'), help='Input format (guessed from the file name by default)')
+    parser.add_argument('--batch-size', type=int, default=50000, help='Edges per transaction')
+    args = parser.parse_args(argv)
+
+    db = SocialNetworkDB(args.db, cache_size=0)
+    fmt = args.format or format_for(args.path)
+    start = time.perf_counter()
+    if args.path == '-':
+        reader = EdgeReader(sys.stdin, fmt)
+        result = db.add_friendships_bulk(reader, args.batch_size)
+    else:
+        with open(args.path, newline='', encoding='utf-8') as f:
+            reader = EdgeReader(f, fmt)
+            result = db.add_friendships_bulk(reader, args.batch_size)
+    result['invalid'] += reader.malformed
+    elapsed = time.perf_counter() - start
+
+    print(f"📥 Imported {result['inserted']} friendships in {elapsed:.1f}s "
+          f"({result['duplicates']} duplicates, {result['invalid']} invalid)")
+
+
+if __name__ == '__main__':
+    main()
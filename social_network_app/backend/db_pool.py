@@ -0,0 +1,105 @@
+from contextlib import contextmanager
+import queue
+import sqlite3
+import threading
+
+
+class ConnectionPool:
+    """Bounded pool of SQLite connections tuned for concurrent readers and writers.
+
+    A thread checks a connection out for the length of a ``with`` block and
+    hands it back afterwards, so short-lived request threads share at most
+    ``max_size`` long-lived connections: connect overhead is paid once and
+    sqlite3's per-connection statement cache keeps the write paths' prepared
+    statements around. Nested blocks in one thread reuse the connection it
+    already holds. Connections use WAL journaling, so readers never block on
+    a writer.
+    """
+
+    PRAGMAS = (
+        'PRAGMA journal_mode=WAL',
+        'PRAGMA synchronous=NORMAL',
+        'PRAGMA temp_store=MEMORY',
+        'PRAGMA cache_size=-65536',
+        'PRAGMA mmap_size=268435456',
+    )
+
+    def __init__(self, db_path, max_size=16, busy_timeout=5.0, cached_statements=256):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        self._idle = queue.LifoQueue()  # most recently used first, its pages are warm
+        self._local = threading.local()  # the connection the thread has checked out
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.busy_timeout,
+            cached_statements=self.cached_statements,
+            check_same_thread=False,
+        )
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if len(self._connections) < self.max_size:
+                conn = self._open()
+                self._connections.append(conn)
+                return conn
+        try:
+            return self._idle.get(timeout=self.busy_timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(f"No free database connection after {self.busy_timeout}s")
+
+    def _checkin(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Check a connection out of the pool for the duration of the block"""
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            yield held
+            return
+        conn = self._checkout()
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._checkin(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Yield a cursor inside a transaction that commits on success and rolls back on error"""
+        with self.connection() as conn:
+            with conn:
+                yield conn.cursor()
+
+    def close_all(self):
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections = []
+            self._idle = queue.LifoQueue()
+        self._local = threading.local()
+
+
+def iter_rows(cursor, batch_size=10000):
+    """Stream the rows of an executed query with fetchmany instead of fetchall"""
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield from rows
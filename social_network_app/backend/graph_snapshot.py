@@ -0,0 +1,143 @@
+"""Binary graph snapshots for fast startup.
+
+Usage:
+    python graph_snapshot.py [--db social_network.db] [--out social_network.snapshot]
+
+A snapshot holds the user id/name table and the CSR adjacency arrays,
+plus the highest users.id and friendships.id it contains. The server
+memory-maps it and replays only the rows written after it.
+
+Layout (little endian, every section 8-byte aligned):
+    header        MAGIC, then uint64 num_users, num_targets, names_size,
+                  max_user_id, max_friendship_id
+    user_ids      int64[num_users]
+    offsets       int64[num_users + 1]
+    targets       int32[num_targets]
+    name_offsets  int64[num_users + 1]
+    names         utf-8 bytes[names_size]
+"""
+import argparse
+import os
+import sqlite3
+import struct
+import time
+
+import numpy as np
+
+from db_pool import iter_rows
+from graph_store import CSRGraph
+
+MAGIC = b'SNGRAPH1'
+HEADER = struct.Struct('<8s5Q')
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _pad(f):
+    f.write(b'\0' * (-f.tell() % 8))
+
+
+def write_snapshot(path, user_ids, names, offsets, targets, max_user_id, max_friendship_id):
+    """Write a snapshot atomically (to a temporary file, then renamed over ``path``)"""
+    encoded = [name.encode('utf-8') for name in names]
+    name_offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(name) for name in encoded], out=name_offsets[1:])
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(user_ids), len(targets), int(name_offsets[-1]),
+                            max_user_id, max_friendship_id))
+        for array in (np.asarray(user_ids, dtype='<i8'), np.asarray(offsets, dtype='<i8'),
+                      np.asarray(targets, dtype='<i4'), name_offsets.astype('<i8')):
+            _pad(f)
+            f.write(array.tobytes())
+        _pad(f)
+        f.write(b''.join(encoded))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path):
+    """Memory-map a snapshot.
+
+    Returns a dict with the ``user_ids``, ``offsets`` and ``targets`` arrays
+    (read-only memory maps), the decoded ``users`` mapping and the
+    ``max_user_id`` / ``max_friendship_id`` high-water marks.
+    """
+    with open(path, 'rb') as f:
+        header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+        raise SnapshotError(f"Truncated snapshot: {path}")
+    magic, num_users, num_targets, names_size, max_user_id, max_friendship_id = HEADER.unpack(header)
+    if magic != MAGIC:
+        raise SnapshotError(f"Not a graph snapshot: {path}")
+
+    position = HEADER.size
+    sections = {}
+    for name, dtype, count in (('user_ids', '<i8', num_users), ('offsets', '<i8', num_users + 1),
+                               ('targets', '<i4', num_targets), ('name_offsets', '<i8', num_users + 1),
+                               ('names', 'u1', names_size)):
+        position += -position % 8
+        sections[name] = np.memmap(path, dtype=dtype, mode='r', offset=position, shape=(count,)) \
+            if count else np.zeros(0, dtype=dtype)
+        position += count * np.dtype(dtype).itemsize
+
+    names = sections['names'].tobytes()
+    name_offsets = sections['name_offsets'].tolist()
+    users = {
+        user_id: names[name_offsets[i]:name_offsets[i + 1]].decode('utf-8')
+        for i, user_id in enumerate(sections['user_ids'].tolist())
+    }
+    return {
+        'user_ids': sections['user_ids'],
+        'offsets': sections['offsets'],
+        'targets': sections['targets'],
+        'users': users,
+        'max_user_id': max_user_id,
+        'max_friendship_id': max_friendship_id,
+    }
+
+
+def build_snapshot(db_path, path):
+    """Stream the database into a CSR graph and write it as a snapshot"""
+    conn = sqlite3.connect(db_path)
+    try:
+        # One read transaction so users, friendships and high-water marks agree
+        conn.execute('BEGIN')
+        max_friendship_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM friendships').fetchone()[0]
+
+        graph = CSRGraph()
+        user_ids, names = [], []
+        for user_id, name in iter_rows(conn.execute('SELECT id, name FROM users ORDER BY id')):
+            graph.add_node(user_id)
+            user_ids.append(user_id)
+            names.append(name)
+        graph.add_edges_from(iter_rows(conn.execute(
+            'SELECT user1_id, user2_id FROM friendships WHERE id <= ?', (max_friendship_id,)
+        )))
+        conn.rollback()
+    finally:
+        conn.close()
+
+    ids, offsets, targets = graph.to_arrays()
+    write_snapshot(path, ids, names, offsets, targets, user_ids[-1] if user_ids else 0, max_friendship_id)
+    return len(user_ids), graph.number_of_edges(), max_friendship_id
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Write a graph snapshot of the social network database')
+    parser.add_argument('--db', default='social_network.db', help='SQLite database file')
+    parser.add_argument('--out', default='social_network.snapshot', help='Snapshot file to write')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    num_users, num_edges, max_friendship_id = build_snapshot(args.db, args.out)
+    print(f"📸 Snapshot written to {args.out}: {num_users} users, {num_edges} friendships "
+          f"(up to friendship #{max_friendship_id}) in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,272 @@
+from array import array
+from collections import Counter
+
+import networkx as nx
+import numpy as np
+
+
+class CSRGraph:
+    """Undirected graph stored as compact CSR arrays plus an append-only delta buffer.
+
+    Node ids are mapped to dense rows. Row ``r`` has neighbors
+    ``targets[offsets[r]:offsets[r + 1]]`` (sorted), and edges added since the
+    last merge live in a small per-row delta buffer until ``merge()`` folds
+    them into the arrays.
+    """
+
+    def __init__(self, merge_threshold=65536):
+        self.merge_threshold = merge_threshold
+        self._index = {}  # node id -> row
+        self._ids = np.zeros(16, dtype=np.int64)  # row -> node id
+        self._num_nodes = 0
+        self._offsets = np.zeros(1, dtype=np.int32)
+        self._targets = np.zeros(0, dtype=np.int32)
+        self._delta = {}  # row -> [rows] added since the last merge
+        self._delta_edges = []  # (row, row) pairs added since the last merge
+        self._num_edges = 0
+
+    # --- Node operations --- #
+
+    def add_node(self, node, **attr):
+        """Add a node (attributes are accepted for networkx compatibility and ignored)"""
+        if node in self._index:
+            return self._index[node]
+        row = self._num_nodes
+        if row == len(self._ids):
+            self._ids = np.resize(self._ids, 2 * len(self._ids))
+        self._ids[row] = node
+        self._index[node] = row
+        self._num_nodes += 1
+        return row
+
+    def add_nodes_from(self, nodes):
+        for node in nodes:
+            self.add_node(node)
+
+    def __contains__(self, node):
+        return node in self._index
+
+    def __len__(self):
+        return self._num_nodes
+
+    def __iter__(self):
+        return iter(self._ids[:self._num_nodes].tolist())
+
+    def nodes(self):
+        return self._ids[:self._num_nodes].tolist()
+
+    def number_of_nodes(self):
+        return self._num_nodes
+
+    # --- Edge operations --- #
+
+    def add_edge(self, u, v):
+        """Add an undirected edge, buffering it until the next merge"""
+        if u == v:
+            return
+        ru = self.add_node(u)
+        rv = self.add_node(v)
+        if self._has_edge_rows(ru, rv):
+            return
+        self._delta.setdefault(ru, []).append(rv)
+        self._delta.setdefault(rv, []).append(ru)
+        self._delta_edges.append((ru, rv))
+        self._num_edges += 1
+        if len(self._delta_edges) >= self.merge_threshold:
+            self.merge()
+
+    def add_edges_from(self, edges):
+        """Add many edges at once and merge them into the CSR arrays in one pass"""
+        pairs = array('i')
+        for u, v in edges:
+            if u == v:
+                continue
+            pairs.append(self.add_node(u))
+            pairs.append(self.add_node(v))
+        self._merge(np.frombuffer(pairs, dtype=np.int32).reshape(-1, 2))
+
+    def has_edge(self, u, v):
+        if u not in self._index or v not in self._index:
+            return False
+        return self._has_edge_rows(self._index[u], self._index[v])
+
+    def neighbors(self, node):
+        """Iterate over the neighbors of ``node``"""
+        if node not in self._index:
+            raise nx.NetworkXError(f"The node {node} is not in the graph.")
+        return iter(self._ids[self.neighbor_rows(self._index[node])].tolist())
+
+    def degree(self, node):
+        row = self._index[node]
+        return self._csr_degree(row) + len(self._delta.get(row, ()))
+
+    def edges(self):
+        """Iterate over every undirected edge exactly once, as of the time of the call"""
+        # Capture the current arrays so a later merge cannot tear the iteration
+        return self._iter_edges(self._offsets, self._targets, self._ids, list(self._delta_edges))
+
+    @staticmethod
+    def _iter_edges(offsets, targets, ids, delta_edges):
+        rows = np.repeat(np.arange(len(offsets) - 1, dtype=np.int32), np.diff(offsets))
+        mask = rows < targets
+        yield from zip(ids[rows[mask]].tolist(), ids[targets[mask]].tolist())
+        for ru, rv in delta_edges:
+            yield int(ids[ru]), int(ids[rv])
+
+    def number_of_edges(self):
+        return self._num_edges
+
+    # --- Row level access (used by the traversal and scoring helpers) --- #
+
+    def row_of(self, node):
+        return self._index[node]
+
+    def ids_of(self, rows):
+        return self._ids[rows]
+
+    def neighbor_rows(self, row):
+        """Neighbor rows of ``row`` as an int32 array"""
+        csr = self._targets[self._offsets[row]:self._offsets[row + 1]] \
+            if row < len(self._offsets) - 1 else self._targets[:0]
+        delta = self._delta.get(row)
+        if delta:
+            return np.concatenate([csr, np.asarray(delta, dtype=np.int32)])
+        return csr
+
+    def neighbor_rows_many(self, rows):
+        """Concatenated neighbor rows of every (distinct) row in ``rows``, with repeats"""
+        return self.neighbor_pairs(rows)[1]
+
+    def neighbor_pairs(self, rows):
+        """(source, neighbor) row arrays for every edge leaving the distinct ``rows``"""
+        rows = np.asarray(rows, dtype=np.int32)
+        csr_rows = rows[rows < len(self._offsets) - 1]
+        starts = self._offsets[csr_rows].astype(np.int64)
+        lengths = self._offsets[csr_rows + 1] - starts
+        # Gather every CSR slice at once: position i of the output reads
+        # targets[starts[row_of_i] + (i - first_i_of_row)]
+        idx = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        sources = [np.repeat(csr_rows, lengths)]
+        targets = [self._targets[idx]]
+        if self._delta:
+            delta_rows = np.fromiter(self._delta, dtype=np.int32, count=len(self._delta))
+            for row in delta_rows[np.isin(delta_rows, rows)].tolist():
+                neighbors = self._delta[row]
+                sources.append(np.full(len(neighbors), row, dtype=np.int32))
+                targets.append(np.asarray(neighbors, dtype=np.int32))
+        if len(targets) == 1:
+            return sources[0], targets[0]
+        return np.concatenate(sources), np.concatenate(targets)
+
+    def mutual_friend_counts(self, node):
+        """Map every node at distance 2 from ``node`` to its number of mutual friends"""
+        row = self._index[node]
+        friends = self.neighbor_rows(row)
+        reached = self.neighbor_rows_many(friends)
+        # Drop the node itself and its direct friends before counting
+        mask = np.isin(reached, friends, invert=True) & (reached != row)
+        candidates, counts = np.unique(reached[mask], return_counts=True)
+        return dict(zip(self._ids[candidates].tolist(), counts.tolist()))
+
+    @classmethod
+    def from_arrays(cls, ids, offsets, targets, **kwargs):
+        """Build a graph around existing (possibly memory-mapped) CSR arrays"""
+        graph = cls(**kwargs)
+        graph._ids = ids
+        graph._num_nodes = len(ids)
+        graph._index = dict(zip(ids.tolist(), range(len(ids))))
+        graph._offsets = offsets
+        graph._targets = targets
+        graph._num_edges = len(targets) // 2
+        return graph
+
+    def to_arrays(self):
+        """Merge pending edges and return the (ids, offsets, targets) arrays"""
+        self.merge()
+        n = self._num_nodes
+        offsets = self._offsets
+        if len(offsets) < n + 1:
+            # Nodes added since the last merge have no CSR neighbors yet
+            offsets = np.concatenate([offsets, np.full(n + 1 - len(offsets), offsets[-1], dtype=offsets.dtype)])
+        return self._ids[:n], offsets, self._targets
+
+    def merge(self):
+        """Fold the delta buffer into the CSR arrays"""
+        self._merge()
+
+    def _merge(self, pairs=None):
+        """Rebuild the CSR arrays from the current ones, the delta buffer and extra row pairs"""
+        delta = np.asarray(self._delta_edges, dtype=np.int32).reshape(-1, 2)
+        if pairs is not None:
+            delta = np.concatenate([delta, pairs])
+        if len(delta) == 0:
+            return
+        n = self._num_nodes
+        old_offsets, old_targets = self._offsets, self._targets
+        old_rows = np.repeat(np.arange(len(old_offsets) - 1, dtype=np.int32), np.diff(old_offsets))
+
+        src = np.concatenate([old_rows, delta[:, 0], delta[:, 1]])
+        dst = np.concatenate([old_targets, delta[:, 1], delta[:, 0]])
+        # Deduplicate (bulk loads may repeat edges) and sort each row
+        keys = np.unique(src.astype(np.int64) * n + dst)
+        src = (keys // n).astype(np.int32)
+        targets = (keys % n).astype(np.int32)
+
+        counts = np.bincount(src, minlength=n)
+        offsets_dtype = np.int32 if len(targets) < np.iinfo(np.int32).max else np.int64
+        offsets = np.zeros(n + 1, dtype=offsets_dtype)
+        np.cumsum(counts, out=offsets[1:])
+
+        self._offsets, self._targets = offsets, targets
+        self._delta = {}
+        self._delta_edges = []
+        self._num_edges = len(targets) // 2
+
+    @property
+    def nbytes(self):
+        """Approximate size of the adjacency arrays in bytes"""
+        return self._offsets.nbytes + self._targets.nbytes + self._ids.nbytes
+
+    # --- Internal helpers --- #
+
+    def _csr_degree(self, row):
+        if row >= len(self._offsets) - 1:
+            return 0
+        return int(self._offsets[row + 1] - self._offsets[row])
+
+    def _has_edge_rows(self, ru, rv):
+        if ru < len(self._offsets) - 1:
+            start, end = self._offsets[ru], self._offsets[ru + 1]
+            pos = start + np.searchsorted(self._targets[start:end], rv)
+            if pos < end and self._targets[pos] == rv:
+                return True
+        return rv in self._delta.get(ru, ())
+
+
+def mutual_friend_counts(graph, node):
+    """Mutual-friend counts for all 2-hop candidates of ``node`` in a single pass"""
+    if node not in graph:
+        return {}
+    if hasattr(graph, 'mutual_friend_counts'):
+        return graph.mutual_friend_counts(node)
+
+    friends = set(graph.neighbors(node))
+    counts = Counter()
+    for friend in friends:
+        counts.update(graph.neighbors(friend))
+    for excluded in friends | {node}:
+        counts.pop(excluded, None)
+    return dict(counts)
+
+
+GRAPH_BACKENDS = {
+    'csr': CSRGraph,
+    'networkx': nx.Graph,
+}
+
+
+def create_graph(backend='csr'):
+    """Create an empty graph for the given backend name"""
+    if backend not in GRAPH_BACKENDS:
+        raise ValueError(f"Unknown graph backend: {backend}")
+    return GRAPH_BACKENDS[backend]()
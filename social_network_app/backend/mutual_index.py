@@ -0,0 +1,92 @@
+import heapq
+
+from graph_store import mutual_friend_counts
+
+
+class MutualFriendIndex:
+    """Precomputed mutual-friend counts for every pair of users at distance 2.
+
+    Rows are updated incrementally as friendships arrive. Each row keeps at
+    most ``max_candidates`` entries, the best by (count, lowest id) like the
+    live ranking, and every count that is kept is exact. When a capped row
+    loses an entry because the pair became friends, a candidate dropped
+    earlier may now belong in it, so add_edge recomputes the row right away:
+    all mutation happens under the caller's write lock and candidates() only
+    reads.
+    """
+
+    def __init__(self, graph, max_candidates=200):
+        self.graph = graph
+        self.max_candidates = max_candidates
+        self._rows = {}  # user -> {candidate: mutual friend count}
+        self._truncated = set()  # users whose row has dropped candidates
+
+    def build(self):
+        """Compute every row from scratch"""
+        self._rows = {}
+        self._truncated = set()
+        for user in self.graph.nodes():
+            self._compute_row(user)
+
+    def _compute_row(self, user):
+        counts = mutual_friend_counts(self.graph, user)
+        if len(counts) > self.max_candidates:
+            counts = dict(heapq.nlargest(self.max_candidates, counts.items(), key=_rank_key))
+            self._truncated.add(user)
+        else:
+            self._truncated.discard(user)
+        if counts:
+            self._rows[user] = counts
+        else:
+            self._rows.pop(user, None)
+
+    def candidates(self, user):
+        """Mapping of 2-hop candidate -> mutual friend count for ``user``"""
+        return self._rows.get(user, {})
+
+    def add_edge(self, u, v):
+        """Update counts after the friendship (u, v) has been added to the graph"""
+        # u is now a mutual friend of v and each of u's other friends, and vice versa
+        for a, b in ((u, v), (v, u)):
+            for friend in self.graph.neighbors(a):
+                if friend == b or self.graph.has_edge(b, friend):
+                    continue
+                self._increment(b, friend)
+                self._increment(friend, b)
+
+        # u and v are direct friends now, so neither is a candidate for the other
+        for a, b in ((u, v), (v, u)):
+            if self._rows.get(a, {}).pop(b, None) is not None and a in self._truncated:
+                self._compute_row(a)
+
+    def size(self):
+        """Total number of stored (user, candidate) pairs"""
+        return sum(len(row) for row in self._rows.values())
+
+    def _increment(self, user, candidate):
+        row = self._rows.setdefault(user, {})
+        if candidate in row:
+            row[candidate] += 1
+            return
+
+        if user in self._truncated:
+            # The candidate may have been dropped earlier, so recount it exactly
+            count = len(set(self.graph.neighbors(user)).intersection(self.graph.neighbors(candidate)))
+        else:
+            count = 1
+
+        if len(row) < self.max_candidates:
+            row[candidate] = count
+            return
+
+        weakest = min(row.items(), key=_rank_key)
+        if _rank_key((candidate, count)) > _rank_key(weakest):
+            del row[weakest[0]]
+            row[candidate] = count
+        self._truncated.add(user)
+
+
+def _rank_key(item):
+    """Order of (candidate, count) pairs: more mutual friends first, then lower id"""
+    candidate, count = item
+    return count, -candidate
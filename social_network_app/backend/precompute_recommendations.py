@@ -0,0 +1,147 @@
+"""Nightly batch job that materializes every user's top-N recommendations.
+
+Usage:
+    python precompute_recommendations.py [--db social_network.db] [--degree 2] [--top-n 50]
+                                         [--workers 8] [--resume]
+
+The graph is loaded once in the parent process; worker processes are
+forked after that, so they share the adjacency arrays copy-on-write instead
+of receiving a pickled graph per task. Each worker ranks a chunk of users
+with the same rules as SocialNetworkDB.get_recommendations and the parent
+writes every returned chunk in one transaction. A run interrupted half way
+can be continued with --resume, which skips users already written by it.
+"""
+import argparse
+import heapq
+import multiprocessing
+import os
+import time
+
+from graph_store import mutual_friend_counts
+from social_db import SocialNetworkDB
+from traversal import BATCH_WIDTH, multi_source_bfs
+
+# Set in the parent before the pool forks; workers read it, never write it
+_db = None
+
+
+def rank_chunk(user_ids, degree, top_n):
+    """Top-N (candidate, degree, mutual friends) rows for each user in the chunk"""
+    graph = _db.graph
+    rows = []
+    for user_id, reached in multi_source_bfs(graph, user_ids, degree):
+        mutual_counts = mutual_friend_counts(graph, user_id)
+        keys = []
+        for friend_id, friend_degree in reached:
+            if friend_degree < 2:
+                continue
+            mutual_friends = mutual_counts.get(friend_id, 0)
+            if friend_degree == 2 and mutual_friends == 0:
+                continue
+            keys.append((friend_degree, -mutual_friends, friend_id))
+
+        for rank, (friend_degree, neg_mutual, friend_id) in enumerate(heapq.nsmallest(top_n, keys)):
+            rows.append((user_id, degree, rank, friend_id, friend_degree, -neg_mutual))
+    return user_ids, rows
+
+
+def _rank_chunk_task(args):
+    return rank_chunk(*args)
+
+
+def start_run(db, degree, top_n, resume):
+    """Return (run_id, user ids still to do), continuing the last unfinished run if asked"""
+    with db.pool.connection() as conn:
+        cursor = conn.cursor()
+        run_id = None
+        if resume:
+            cursor.execute('''
+                SELECT id FROM precompute_runs
+                WHERE degree = ? AND top_n = ? AND finished_at IS NULL
+                ORDER BY id DESC LIMIT 1
+            ''', (degree, top_n))
+            row = cursor.fetchone()
+            run_id = row[0] if row else None
+
+        if run_id is None:
+            with db.pool.transaction() as tx:
+                tx.execute('INSERT INTO precompute_runs (degree, top_n) VALUES (?, ?)', (degree, top_n))
+                run_id = tx.lastrowid
+            done = set()
+        else:
+            cursor.execute(
+                'SELECT DISTINCT user_id FROM precomputed_recommendations WHERE run_id = ? AND degree = ?',
+                (run_id, degree)
+            )
+            done = {row[0] for row in cursor.fetchall()}
+        cursor.close()
+
+    return run_id, [user_id for user_id in sorted(db.users) if user_id not in done]
+
+
+def write_chunk(db, run_id, degree, user_ids, rows):
+    with db.pool.transaction() as cursor:
+        cursor.executemany(
+            'DELETE FROM precomputed_recommendations WHERE user_id = ? AND degree = ?',
+            [(user_id, degree) for user_id in user_ids]
+        )
+        cursor.executemany('''
+            INSERT INTO precomputed_recommendations
+                (user_id, degree, rank, candidate_id, candidate_degree, mutual_friends, run_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', [row + (run_id,) for row in rows])
+
+
+def run(db_path, degree=2, top_n=50, workers=None, chunk_size=BATCH_WIDTH * 4,
+        resume=False, snapshot_path=None):
+    global _db
+    _db = SocialNetworkDB(db_path, cache_size=0, snapshot_path=snapshot_path)
+    run_id, user_ids = start_run(_db, degree, top_n, resume)
+    total = len(user_ids)
+    print(f"🗓️ Precompute run #{run_id}: {total} users, degree {degree}, top {top_n}")
+
+    tasks = [(user_ids[i:i + chunk_size], degree, top_n) for i in range(0, total, chunk_size)]
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    done = 0
+
+    if workers > 1 and 'fork' in multiprocessing.get_all_start_methods():
+        pool = multiprocessing.get_context('fork').Pool(workers)
+        results = pool.imap_unordered(_rank_chunk_task, tasks)
+    else:
+        pool = None
+        results = map(_rank_chunk_task, tasks)
+
+    try:
+        for chunk_user_ids, rows in results:
+            write_chunk(_db, run_id, degree, chunk_user_ids, rows)
+            done += len(chunk_user_ids)
+            elapsed = time.perf_counter() - start
+            print(f"⏳ {done}/{total} users ({done / elapsed:.0f} users/s)")
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    with _db.pool.transaction() as cursor:
+        cursor.execute('UPDATE precompute_runs SET finished_at = CURRENT_TIMESTAMP WHERE id = ?', (run_id,))
+    print(f"✅ Precompute run #{run_id} finished in {time.perf_counter() - start:.1f}s")
+    return run_id
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Materialize top-N recommendations for every user')
+    parser.add_argument('--db', default='social_network.db', help='SQLite database file')
+    parser.add_argument('--snapshot', help='Graph snapshot to start from')
+    parser.add_argument('--degree', type=int, default=2, help='Maximum degree of separation')
+    parser.add_argument('--top-n', type=int, default=50, help='Recommendations kept per user')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: CPU count)')
+    parser.add_argument('--chunk-size', type=int, default=BATCH_WIDTH * 4, help='Users per task')
+    parser.add_argument('--resume', action='store_true', help='Continue the last unfinished run')
+    args = parser.parse_args(argv)
+
+    run(args.db, args.degree, args.top_n, args.workers, args.chunk_size, args.resume, args.snapshot)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+from collections import OrderedDict
+import threading
+import time
+
+
+class RecommendationCache:
+    """LRU/TTL cache of ranked recommendation keys, keyed by (user_id, degree).
+
+    Memory is bounded both by the number of entries and by the total number
+    of cached ranking keys across all entries.
+    """
+
+    def __init__(self, max_entries=10000, max_items=2_000_000, ttl=300):
+        self.max_entries = max_entries
+        self.max_items = max_items
+        self.ttl = ttl
+        self._entries = OrderedDict()  # (user_id, degree) -> (expires_at, ranking)
+        self._items = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, user_id, degree):
+        """Return the cached ranking or None"""
+        key = (user_id, degree)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, ranking = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return ranking
+
+    def put(self, user_id, degree, ranking):
+        if len(ranking) > self.max_items:
+            return
+        key = (user_id, degree)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, ranking)
+            self._items += len(ranking)
+            while len(self._entries) > self.max_entries or self._items > self.max_items:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def max_degree(self):
+        """Largest degree currently cached (0 when empty)"""
+        with self._lock:
+            return max((degree for _, degree in self._entries), default=0)
+
+    def invalidate_near(self, distances):
+        """Drop entries whose neighborhood may contain a changed node.
+
+        ``distances`` maps users to their hop distance from the nearest
+        endpoint of a new edge; an entry (user, k) is stale when that
+        distance is at most k - 1.
+        """
+        with self._lock:
+            stale = [
+                key for key in self._entries
+                if key[0] in distances and distances[key[0]] <= key[1] - 1
+            ]
+            for key in stale:
+                self._remove(key)
+            self.invalidations += len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._items = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'cached_items': self._items,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+    def _remove(self, key):
+        _, ranking = self._entries.pop(key)
+        self._items -= len(ranking)
@@ -0,0 +1,47 @@
+from contextlib import contextmanager
+import threading
+
+
+class ReadWriteLock:
+    """Many concurrent readers or one writer.
+
+    Writers are preferred: once a writer is waiting, new readers queue
+    behind it, so a steady stream of reads cannot starve graph updates.
+    Writers only hold the lock for in-memory mutations, which keeps the time
+    readers spend waiting short.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
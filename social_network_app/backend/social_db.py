@@ -0,0 +1,620 @@
+from itertools import islice
+import bisect
+import heapq
+import os
+import random
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from db_pool import ConnectionPool, iter_rows
+from graph_snapshot import SnapshotError, read_snapshot
+from graph_store import CSRGraph, create_graph, mutual_friend_counts
+from metrics import stage
+from mutual_index import MutualFriendIndex
+from recommendation_cache import RecommendationCache
+from rwlock import ReadWriteLock
+from traversal import bfs_levels, bidirectional_distance, hop_distances
+from write_queue import GroupCommitQueue
+
+# Catch-up batches larger than this are applied in bulk instead of edge by edge
+SYNC_BULK_THRESHOLD = 1000
+
+class SocialNetworkDB:
+    def __init__(self, db_path='social_network.db', graph_backend='csr',
+                 cache_size=10000, cache_ttl=300, mutual_index_size=None,
+                 group_commit_interval=None, snapshot_path=None, sync_interval=None):
+        self.db_path = db_path
+        self.snapshot_path = snapshot_path
+        self.pool = ConnectionPool(db_path)
+        self.graph_backend = graph_backend
+        self.graph = create_graph(graph_backend)
+        self.users = {}
+        # High-water marks of the rows already applied to the graph
+        self.last_user_id = 0
+        self.last_friendship_id = 0
+        self.recommendation_cache = RecommendationCache(cache_size, ttl=cache_ttl) if cache_size else None
+        # Readers share self.lock; writers take it exclusively only while mutating memory.
+        # _write_mutex serializes writers end to end (check, insert, apply).
+        self.lock = ReadWriteLock()
+        self._write_mutex = threading.RLock()
+        # Catch up with rows written by other processes at most every sync_interval seconds
+        self.sync_interval = sync_interval
+        self._last_sync = time.monotonic()
+        self._sync_lock = threading.Lock()
+        self.init_database()
+        self._load_data_from_db()
+        # Optional precomputed 2-hop table, capped at mutual_index_size candidates per user
+        self.mutual_index = MutualFriendIndex(self.graph, mutual_index_size) if mutual_index_size else None
+        if self.mutual_index is not None:
+            self.mutual_index.build()
+            print(f"🧮 Mutual friend index built: {self.mutual_index.size()} candidate pairs")
+        # Optional write-behind queue: single friendship inserts are committed in groups
+        self.write_queue = GroupCommitQueue(self.pool, group_commit_interval) if group_commit_interval else None
+    
+    def init_database(self):
+        """Initialize SQLite database with tables"""
+        with self.pool.transaction() as cursor:
+            self._create_tables(cursor)
+        print(f"✅ Database initialized: {self.db_path}")
+    
+    def _create_tables(self, cursor):
+        """Create tables and seed sample data when the database is empty"""
+        # Create users table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL UNIQUE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Create friendships table
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS friendships (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user1_id INTEGER,
+                user2_id INTEGER,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (user1_id) REFERENCES users (id),
+                FOREIGN KEY (user2_id) REFERENCES users (id),
+                UNIQUE(user1_id, user2_id)
+            )
+        ''')
+        
+        # Create tables for the offline recommendation job (precompute_recommendations.py)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS precompute_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                degree INTEGER NOT NULL,
+                top_n INTEGER NOT NULL,
+                started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                finished_at TIMESTAMP
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS precomputed_recommendations (
+                user_id INTEGER NOT NULL,
+                degree INTEGER NOT NULL,
+                rank INTEGER NOT NULL,
+                candidate_id INTEGER NOT NULL,
+                candidate_degree INTEGER NOT NULL,
+                mutual_friends INTEGER NOT NULL,
+                run_id INTEGER NOT NULL,
+                PRIMARY KEY (user_id, degree, rank)
+            ) WITHOUT ROWID
+        ''')
+        
+        # Insert sample data if empty
+        cursor.execute('SELECT COUNT(*) FROM users')
+        if cursor.fetchone()[0] == 0:
+            self._insert_sample_data(cursor)
+    
+    def _insert_sample_data(self, cursor):
+        """Insert sample users and friendships"""
+        sample_users = [
+            "Alice", "Bob", "Charlie", "Diana", "Eve", 
+            "Frank", "Grace", "Henry", "Ivy", "Jack",
+            "Karen", "Leo", "Mia", "Nathan", "Olivia"
+        ]
+        
+        # Insert users
+        for name in sample_users:
+            cursor.execute('INSERT OR IGNORE INTO users (name) VALUES (?)', (name,))
+        
+        # Define friendships (more balanced network)
+        friendships = [
+            (1, 2), (1, 3), (1, 4), (1, 5),
+            (2, 3), (2, 4), (2, 6),
+            (3, 4), (3, 7),
+            (4, 5), (4, 8),
+            (5, 9), (5, 10),
+            (6, 11), (6, 12),
+            (7, 13), (7, 14),
+            (8, 15), (8, 1),
+            (9, 10), (9, 11),
+            (10, 12),
+            (11, 13),
+            (12, 14),
+            (13, 15),
+            (14, 15),
+            (9, 1),
+            (15, 2)
+        ]
+        
+        # Insert friendships
+        for user1_id, user2_id in friendships:
+            try:
+                cursor.execute(
+                    'INSERT OR IGNORE INTO friendships (user1_id, user2_id) VALUES (?, ?)',
+                    (user1_id, user2_id)
+                )
+            except sqlite3.IntegrityError:
+                pass  # Friendship already exists
+        
+        print("📊 Sample data inserted into database")
+    
+    def _load_data_from_db(self):
+        """Load users and friendships into the graph, starting from a snapshot when one exists"""
+        source = 'database'
+        if self.snapshot_path and os.path.exists(self.snapshot_path):
+            try:
+                self._load_snapshot(self.snapshot_path)
+                source = f"snapshot {self.snapshot_path} + database"
+            except SnapshotError as e:
+                print(f"⚠️ Ignoring snapshot: {e}")
+        
+        self._replay_changes()
+        print(f"📈 Loaded {len(self.users)} users and {self.graph.number_of_edges()} friendships from {source}")
+    
+    def _load_snapshot(self, path):
+        """Memory-map a graph snapshot as the starting graph"""
+        snapshot = read_snapshot(path)
+        user_ids, offsets, targets = snapshot['user_ids'], snapshot['offsets'], snapshot['targets']
+        
+        if self.graph_backend == 'csr':
+            self.graph = CSRGraph.from_arrays(user_ids, offsets, targets)
+        else:
+            self.graph = create_graph(self.graph_backend)
+            self.graph.add_nodes_from(user_ids.tolist())
+            rows = np.repeat(np.arange(len(user_ids)), np.diff(offsets))
+            mask = rows < targets
+            self.graph.add_edges_from(zip(user_ids[rows[mask]].tolist(), user_ids[targets[mask]].tolist()))
+        
+        self.users = snapshot['users']
+        self.last_user_id = snapshot['max_user_id']
+        self.last_friendship_id = snapshot['max_friendship_id']
+    
+    def _replay_changes(self):
+        """Stream users and friendships written after the high-water marks into the graph"""
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('SELECT id, name FROM users WHERE id > ? ORDER BY id', (self.last_user_id,))
+            for user_id, name in iter_rows(cursor):
+                self.users[user_id] = name
+                self.graph.add_node(user_id, name=name)
+                self.last_user_id = user_id
+            
+            cursor.execute(
+                'SELECT id, user1_id, user2_id FROM friendships WHERE id > ? ORDER BY id',
+                (self.last_friendship_id,)
+            )
+            self.graph.add_edges_from(self._track_friendship_ids(iter_rows(cursor)))
+            cursor.close()
+    
+    def _track_friendship_ids(self, rows):
+        for friendship_id, user1_id, user2_id in rows:
+            self.last_friendship_id = friendship_id
+            yield user1_id, user2_id
+    
+    def add_user(self, name):
+        """Add a new user to the database and graph"""
+        try:
+            with self.pool.transaction() as cursor:
+                cursor.execute('INSERT INTO users (name) VALUES (?)', (name,))
+                user_id = cursor.lastrowid
+            
+            # Update graph
+            with self._write_mutex, self.lock.write():
+                self.users[user_id] = name
+                self.graph.add_node(user_id, name=name)
+            
+            print(f"✅ Added new user: {name} (ID: {user_id})")
+            return user_id
+        except sqlite3.IntegrityError:
+            print(f"⚠️ User '{name}' already exists")
+            return None
+    
+    def list_users(self):
+        """(id, name) pairs for every user"""
+        with self.lock.read():
+            return list(self.users.items())
+    
+    def add_friendship(self, user1_id, user2_id):
+        """Add a new friendship to the database and graph"""
+        if user1_id not in self.users or user2_id not in self.users or user1_id == user2_id:
+            print(f"❌ Invalid user IDs: {user1_id} or {user2_id}")
+            return False
+        
+        with self._write_mutex:
+            if self.graph.has_edge(user1_id, user2_id):
+                print(f"⚠️ Friendship already exists: {self.users[user1_id]} ↔ {self.users[user2_id]}")
+                return False
+            
+            if self.write_queue is not None:
+                # The graph is updated now; the row is committed with the next group
+                self._apply_friendship(user1_id, user2_id)
+                self.write_queue.submit(min(user1_id, user2_id), max(user1_id, user2_id))
+                return True
+            
+            try:
+                # Rows are stored as (smaller id, larger id) so that UNIQUE(user1_id, user2_id)
+                # also rejects the reversed pair written by another worker
+                with self.pool.transaction() as cursor:
+                    cursor.execute(
+                        'INSERT INTO friendships (user1_id, user2_id) VALUES (?, ?)',
+                        (min(user1_id, user2_id), max(user1_id, user2_id))
+                    )
+                
+                # Update graph
+                self._apply_friendship(user1_id, user2_id)
+                print(f"✅ Added friendship: {self.users[user1_id]} ↔ {self.users[user2_id]}")
+                return True
+            except sqlite3.IntegrityError:
+                print(f"⚠️ Friendship already exists: {self.users[user1_id]} ↔ {self.users[user2_id]}")
+                return False
+    
+    def add_friendships_bulk(self, edges, batch_size=50000):
+        """Insert many friendships with one transaction per batch.
+        
+        Edges referencing unknown users are skipped as invalid; edges already
+        in the graph (in either direction) or repeated in the input are skipped
+        as duplicates. Returns counts of inserted, duplicate and invalid edges.
+        """
+        result = {'inserted': 0, 'duplicates': 0, 'invalid': 0}
+        edges = iter(edges)
+        
+        with self._write_mutex:
+            self._add_friendships_bulk(edges, batch_size, result)
+        
+        print(f"📥 Bulk import: {result['inserted']} inserted, "
+              f"{result['duplicates']} duplicates, {result['invalid']} invalid")
+        return result
+    
+    def _add_friendships_bulk(self, edges, batch_size, result):
+        while True:
+            chunk = list(islice(edges, batch_size))
+            if not chunk:
+                break
+            
+            seen = set()
+            rows = []
+            for user1_id, user2_id in chunk:
+                if user1_id == user2_id or user1_id not in self.users or user2_id not in self.users:
+                    result['invalid'] += 1
+                    continue
+                pair = (min(user1_id, user2_id), max(user1_id, user2_id))
+                if pair in seen or self.graph.has_edge(user1_id, user2_id):
+                    result['duplicates'] += 1
+                    continue
+                seen.add(pair)
+                rows.append(pair)
+            
+            if rows:
+                with self.pool.transaction() as cursor:
+                    cursor.executemany(
+                        'INSERT OR IGNORE INTO friendships (user1_id, user2_id) VALUES (?, ?)', rows
+                    )
+                with self.lock.write():
+                    self.graph.add_edges_from(rows)
+                result['inserted'] += len(rows)
+        
+        if result['inserted']:
+            self._rebuild_derived()
+    
+    def _rebuild_derived(self):
+        """Reset state derived from the graph after a large batch of edges"""
+        # Too many neighborhoods changed to invalidate edge by edge
+        with self.lock.write():
+            if self.mutual_index is not None:
+                self.mutual_index.build()
+            if self.recommendation_cache is not None:
+                self.recommendation_cache.clear()
+    
+    def _apply_friendship(self, user1_id, user2_id):
+        """Apply a stored friendship to the graph and everything derived from it"""
+        if user1_id == user2_id or self.graph.has_edge(user1_id, user2_id):
+            return
+        with self.lock.write():
+            self.graph.add_edge(user1_id, user2_id)
+            if self.mutual_index is not None:
+                self.mutual_index.add_edge(user1_id, user2_id)
+            self._invalidate_recommendations(user1_id, user2_id)
+    
+    def sync_from_db(self, force=False):
+        """Apply users and friendships committed by other processes since the last sync.
+        
+        Uses the autoincrement ids of both tables as a change log. Rows this
+        process wrote itself are already in the graph and are skipped before
+        anything is applied, so a local bulk import does not trigger a rebuild.
+        Returns the number of friendships applied, or None when skipped.
+        """
+        if not force and (self.sync_interval is None
+                          or time.monotonic() - self._last_sync < self.sync_interval):
+            return None
+        if not self._sync_lock.acquire(blocking=False):
+            return None  # another thread is already catching up
+        try:
+            self._last_sync = time.monotonic()
+            with self._write_mutex:
+                with self.pool.connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute('SELECT id, name FROM users WHERE id > ? ORDER BY id', (self.last_user_id,))
+                    new_users = cursor.fetchall()
+                    cursor.execute(
+                        'SELECT id, user1_id, user2_id FROM friendships WHERE id > ? ORDER BY id',
+                        (self.last_friendship_id,)
+                    )
+                    last_id = None
+                    new_edges = []
+                    seen = set()
+                    for friendship_id, user1_id, user2_id in iter_rows(cursor):
+                        last_id = friendship_id
+                        pair = (min(user1_id, user2_id), max(user1_id, user2_id))
+                        if user1_id == user2_id or pair in seen or self.graph.has_edge(user1_id, user2_id):
+                            continue
+                        seen.add(pair)
+                        new_edges.append(pair)
+                    cursor.close()
+                
+                if new_users:
+                    with self.lock.write():
+                        for user_id, name in new_users:
+                            self.users[user_id] = name
+                            self.graph.add_node(user_id, name=name)
+                    self.last_user_id = new_users[-1][0]
+                
+                if len(new_edges) > SYNC_BULK_THRESHOLD:
+                    with self.lock.write():
+                        self.graph.add_edges_from(new_edges)
+                    self._rebuild_derived()
+                else:
+                    for user1_id, user2_id in new_edges:
+                        self._apply_friendship(user1_id, user2_id)
+                if last_id is not None:
+                    self.last_friendship_id = last_id
+            return len(new_edges)
+        finally:
+            self._sync_lock.release()
+    
+    def get_friends_within_degree(self, user_id, degree):
+        """BFS to find friends within specified degree"""
+        with self.lock.read():
+            return self._friends_within_degree(user_id, degree)
+    
+    def _friends_within_degree(self, user_id, degree):
+        return [
+            (friend_id, friend_degree)
+            for friend_degree, friends in bfs_levels(self.graph, (user_id,), degree)
+            if friend_degree >= 2
+            for friend_id in friends
+        ]
+    
+    def get_degree_of_separation(self, user1_id, user2_id, max_depth=None):
+        """Number of hops between two users (None if unconnected or beyond max_depth)"""
+        with self.lock.read():
+            return bidirectional_distance(self.graph, user1_id, user2_id, max_depth)
+    
+    def _invalidate_recommendations(self, user1_id, user2_id):
+        """Drop cached recommendations whose degree-k neighborhood reaches the new edge"""
+        if self.recommendation_cache is None:
+            return
+        max_degree = self.recommendation_cache.max_degree()
+        if max_degree == 0:
+            return
+        distances = hop_distances(self.graph, (user1_id, user2_id), max_degree - 1)
+        self.recommendation_cache.invalidate_near(distances)
+    
+    def get_mutual_friends_count(self, user1_id, user2_id):
+        """Count mutual friends between two users"""
+        if user1_id not in self.graph or user2_id not in self.graph:
+            return 0
+        
+        with self.lock.read():
+            friends1 = set(self.graph.neighbors(user1_id))
+            friends2 = set(self.graph.neighbors(user2_id))
+        
+        friends1.discard(user2_id)
+        friends2.discard(user1_id)
+        
+        return len(friends1.intersection(friends2))
+    
+    def _rank_candidates(self, user_id, degree):
+        """Ranking keys (degree, -mutual_friends, id) for every recommendable user"""
+        if degree == 2 and self.mutual_index is not None:
+            with stage('mutual_count'):
+                candidates = self.mutual_index.candidates(user_id)
+            return [(2, -count, friend_id) for friend_id, count in candidates.items()]
+        
+        with stage('bfs'):
+            friends_within_degree = self._friends_within_degree(user_id, degree)
+        # Score every 2-hop candidate at once; anything further away has no mutual friends
+        with stage('mutual_count'):
+            mutual_counts = mutual_friend_counts(self.graph, user_id)
+        
+        keys = []
+        for friend_id, friend_degree in friends_within_degree:
+            mutual_friends = mutual_counts.get(friend_id, 0)
+            
+            if friend_degree == 2 and mutual_friends == 0:
+                continue
+            
+            keys.append((friend_degree, -mutual_friends, friend_id))
+        return keys
+    
+    def _recommendation(self, key):
+        friend_degree, neg_mutual, friend_id = key
+        return {
+            'id': friend_id,
+            'name': self.users[friend_id],
+            'degree': friend_degree,
+            'mutual_friends': -neg_mutual
+        }
+    
+    def _cached_ranking(self, user_id, degree):
+        """Sorted ranking keys from the recommendation cache, computing them on a miss"""
+        ranking = self.recommendation_cache.get(user_id, degree)
+        if ranking is None:
+            keys = self._rank_candidates(user_id, degree)
+            with stage('sort'):
+                ranking = tuple(sorted(keys))
+            self.recommendation_cache.put(user_id, degree, ranking)
+        return ranking
+    
+    def get_recommendations(self, user_id, degree=2):
+        """Get friend recommendations"""
+        with self.lock.read():
+            if self.recommendation_cache is not None:
+                keys = self._cached_ranking(user_id, degree)
+            else:
+                keys = self._rank_candidates(user_id, degree)
+                with stage('sort'):
+                    keys.sort()
+        with stage('serialize'):
+            return [self._recommendation(key) for key in keys]
+    
+    def get_recommendation_page(self, user_id, degree=2, limit=20, after=None):
+        """Get the top `limit` recommendations ranked after the `after` key.
+        
+        Returns (recommendations, next_key); next_key is None on the last page.
+        """
+        with self.lock.read():
+            if self.recommendation_cache is not None:
+                # Cached rankings are already sorted, so a page is a slice
+                ranking = self._cached_ranking(user_id, degree)
+                start = bisect.bisect_right(ranking, after) if after is not None else 0
+                top = ranking[start:start + limit + 1]
+            else:
+                keys = self._rank_candidates(user_id, degree)
+                if after is not None:
+                    keys = [key for key in keys if key > after]
+                # Bounded heap: only limit + 1 keys are kept, the extra one tells us there is a next page
+                with stage('sort'):
+                    top = heapq.nsmallest(limit + 1, keys)
+        
+        page = top[:limit]
+        next_key = page[-1] if len(top) > limit else None
+        with stage('serialize'):
+            return [self._recommendation(key) for key in page], next_key
+    
+    def select_network_nodes(self, ego=None, hops=1, min_degree=None, sample=None, seed=None):
+        """Pick the users to export: an ego network, a degree filter and/or a random sample.
+        
+        Returns None for the whole graph, otherwise a set of user ids.
+        """
+        if ego is None and min_degree is None and sample is None:
+            return None
+        
+        with self.lock.read():
+            if ego is not None:
+                nodes = list(hop_distances(self.graph, (ego,), hops))
+            else:
+                nodes = list(self.graph.nodes())
+            
+            if min_degree is not None:
+                nodes = [node for node in nodes if self.graph.degree(node) >= min_degree]
+        
+        if sample is not None and sample < len(nodes):
+            nodes = random.Random(seed).sample(list(nodes), sample)
+        
+        return set(nodes)
+    
+    def iter_network_nodes(self, selected=None):
+        """Yield visualization node dicts, lazily"""
+        if selected is None:
+            with self.lock.read():
+                nodes = list(self.graph.nodes())
+        else:
+            nodes = sorted(selected)
+        return (
+            {
+                'id': node,
+                'label': self.users[node],
+                'name': self.users[node]
+            }
+            for node in nodes
+        )
+    
+    def iter_network_edges(self, selected=None):
+        """Yield visualization edge dicts for the edges among the selected users, lazily"""
+        # Capture the edges under the read lock; serialization happens after it is released
+        with self.lock.read():
+            if selected is None:
+                edges = self.graph.edges()
+                if not isinstance(self.graph, CSRGraph):
+                    edges = list(edges)  # networkx views are live
+            else:
+                edges = [
+                    (node, neighbor)
+                    for node in sorted(selected)
+                    for neighbor in self.graph.neighbors(node)
+                    if node < neighbor and neighbor in selected
+                ]
+        return ({'from': user1_id, 'to': user2_id} for user1_id, user2_id in edges)
+    
+    def get_precomputed_recommendations(self, user_id, degree=2, limit=None, after=None):
+        """Read recommendations materialized by the offline job, ranked after the `after` key.
+        
+        Returns (recommendations, next_key) like get_recommendation_page, or
+        None when the job has not produced anything for this user.
+        """
+        after_degree, after_neg_mutual, after_id = after if after is not None else (0, 0, 0)
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT candidate_degree, -mutual_friends, candidate_id
+                FROM precomputed_recommendations
+                WHERE user_id = ? AND degree = ?
+                  AND (candidate_degree, -mutual_friends, candidate_id) > (?, ?, ?)
+                ORDER BY rank
+                LIMIT ?
+            ''', (user_id, degree, after_degree, after_neg_mutual, after_id, -1 if limit is None else limit + 1))
+            keys = [tuple(row) for row in cursor.fetchall()]
+            cursor.close()
+        
+        if not keys and after is None:
+            return None
+        page = keys if limit is None else keys[:limit]
+        next_key = page[-1] if limit is not None and len(keys) > limit else None
+        return [self._recommendation(key) for key in page if key[2] in self.users], next_key
+    
+    def get_network_data(self, selected=None):
+        """Get network data for visualization"""
+        return {
+            'nodes': list(self.iter_network_nodes(selected)),
+            'edges': list(self.iter_network_edges(selected))
+        }
+    
+    def get_database_stats(self):
+        """Get database statistics"""
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('SELECT COUNT(*) FROM users')
+            user_count = cursor.fetchone()[0]
+            
+            cursor.execute('SELECT COUNT(*) FROM friendships')
+            friendship_count = cursor.fetchone()[0]
+            
+            cursor.close()
+        
+        return {
+            'users_in_db': user_count,
+            'friendships_in_db': friendship_count,
+            'users_in_memory': len(self.users),
+            'friendships_in_memory': self.graph.number_of_edges(),
+            'recommendation_cache': self.recommendation_cache.stats() if self.recommendation_cache else None
+        }
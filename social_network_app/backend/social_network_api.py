@@ -1,279 +1,85 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, g, jsonify, request, stream_with_context
 from flask_cors import CORS
-import networkx as nx
-from collections import deque
-import sqlite3
+from itertools import islice
+import base64
+import io
+import json
 import os
+import time
 
-app = Flask(__name__)
-CORS(app)
+from bulk_import import EdgeReader, format_for
+from metrics import (CONTENT_TYPE, MAX_PROFILE_SECONDS, PROFILER, PROFILER_ENABLED, REGISTRY,
+                     REQUEST_SECONDS, REQUESTS_IN_PROGRESS, stage)
+from social_db import SocialNetworkDB
 
-class SocialNetworkDB:
-    def __init__(self, db_path='social_network.db'):
-        self.db_path = db_path
-        self.graph = nx.Graph()
-        self.users = {}
-        self.init_database()
-        self._load_data_from_db()
-    
-    def init_database(self):
-        """Initialize SQLite database with tables"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Create users table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL UNIQUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Create friendships table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS friendships (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user1_id INTEGER,
-                user2_id INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user1_id) REFERENCES users (id),
-                FOREIGN KEY (user2_id) REFERENCES users (id),
-                UNIQUE(user1_id, user2_id)
-            )
-        ''')
-        
-        # Insert sample data if empty
-        cursor.execute('SELECT COUNT(*) FROM users')
-        if cursor.fetchone()[0] == 0:
-            self._insert_sample_data(cursor)
-        
-        conn.commit()
-        conn.close()
-        print(f"✅ Database initialized: {self.db_path}")
-    
-    def _insert_sample_data(self, cursor):
-        """Insert sample users and friendships"""
-        sample_users = [
-            "Alice", "Bob", "Charlie", "Diana", "Eve", 
-            "Frank", "Grace", "Henry", "Ivy", "Jack",
-            "Karen", "Leo", "Mia", "Nathan", "Olivia"
-        ]
-        
-        # Insert users
-        for name in sample_users:
-            cursor.execute('INSERT OR IGNORE INTO users (name) VALUES (?)', (name,))
-        
-        # Define friendships (more balanced network)
-        friendships = [
-            (1, 2), (1, 3), (1, 4), (1, 5),
-            (2, 3), (2, 4), (2, 6),
-            (3, 4), (3, 7),
-            (4, 5), (4, 8),
-            (5, 9), (5, 10),
-            (6, 11), (6, 12),
-            (7, 13), (7, 14),
-            (8, 15), (8, 1),
-            (9, 10), (9, 11),
-            (10, 12),
-            (11, 13),
-            (12, 14),
-            (13, 15),
-            (14, 15),
-            (9, 1),
-            (15, 2)
-        ]
-        
-        # Insert friendships
-        for user1_id, user2_id in friendships:
-            try:
-                cursor.execute(
-                    'INSERT OR IGNORE INTO friendships (user1_id, user2_id) VALUES (?, ?)',
-                    (user1_id, user2_id)
-                )
-            except sqlite3.IntegrityError:
-                pass  # Friendship already exists
-        
-        print("📊 Sample data inserted into database")
-    
-    def _load_data_from_db(self):
-        """Load users and friendships from database into graph"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Load users
-        cursor.execute('SELECT id, name FROM users ORDER BY id')
-        users = cursor.fetchall()
-        self.users = {row[0]: row[1] for row in users}
-        
-        # Add users to graph
-        for user_id, name in users:
-            self.graph.add_node(user_id, name=name)
-        
-        # Load friendships
-        cursor.execute('SELECT user1_id, user2_id FROM friendships')
-        friendships = cursor.fetchall()
-        
-        # Add edges to graph
-        for user1_id, user2_id in friendships:
-            self.graph.add_edge(user1_id, user2_id)
-        
-        conn.close()
-        print(f"📈 Loaded {len(self.users)} users and {len(friendships)} friendships from database")
-    
-    def add_user(self, name):
-        """Add a new user to the database and graph"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute('INSERT INTO users (name) VALUES (?)', (name,))
-            user_id = cursor.lastrowid
-            conn.commit()
-            
-            # Update graph
-            self.users[user_id] = name
-            self.graph.add_node(user_id, name=name)
-            
-            print(f"✅ Added new user: {name} (ID: {user_id})")
-            return user_id
-        except sqlite3.IntegrityError:
-            print(f"⚠️ User '{name}' already exists")
-            return None
-        finally:
-            conn.close()
-    
-    def add_friendship(self, user1_id, user2_id):
-        """Add a new friendship to the database and graph"""
-        if user1_id not in self.users or user2_id not in self.users:
-            print(f"❌ Invalid user IDs: {user1_id} or {user2_id}")
-            return False
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute(
-                'INSERT INTO friendships (user1_id, user2_id) VALUES (?, ?)',
-                (user1_id, user2_id)
-            )
-            conn.commit()
-            
-            # Update graph
-            self.graph.add_edge(user1_id, user2_id)
-            print(f"✅ Added friendship: {self.users[user1_id]} ↔ {self.users[user2_id]}")
-            return True
-        except sqlite3.IntegrityError:
-            print(f"⚠️ Friendship already exists: {self.users[user1_id]} ↔ {self.users[user2_id]}")
-            return False
-        finally:
-            conn.close()
-    
-    def get_friends_within_degree(self, user_id, degree):
-        """BFS to find friends within specified degree"""
-        if user_id not in self.graph:
-            return []
-        
-        visited = set()
-        queue = deque([(user_id, 0)])
-        visited.add(user_id)
-        friends_within_degree = []
-        
-        while queue:
-            current_user, current_degree = queue.popleft()
-            
-            if 2 <= current_degree <= degree:
-                friends_within_degree.append((current_user, current_degree))
-            
-            if current_degree < degree:
-                for neighbor in self.graph.neighbors(current_user):
-                    if neighbor not in visited:
-                        visited.add(neighbor)
-                        queue.append((neighbor, current_degree + 1))
-        
-        return friends_within_degree
-    
-    def get_mutual_friends_count(self, user1_id, user2_id):
-        """Count mutual friends between two users"""
-        if user1_id not in self.graph or user2_id not in self.graph:
-            return 0
-        
-        friends1 = set(self.graph.neighbors(user1_id))
-        friends2 = set(self.graph.neighbors(user2_id))
-        
-        friends1.discard(user2_id)
-        friends2.discard(user1_id)
-        
-        return len(friends1.intersection(friends2))
-    
-    def get_recommendations(self, user_id, degree=2):
-        """Get friend recommendations"""
-        friends_within_degree = self.get_friends_within_degree(user_id, degree)
-        
-        recommendations = []
-        for friend_id, friend_degree in friends_within_degree:
-            mutual_friends = self.get_mutual_friends_count(user_id, friend_id)
-            
-            if friend_degree == 2 and mutual_friends == 0:
-                continue
-                
-            recommendations.append({
-                'id': friend_id,
-                'name': self.users[friend_id],
-                'degree': friend_degree,
-                'mutual_friends': mutual_friends
-            })
-        
-        recommendations.sort(key=lambda x: (x['degree'], -x['mutual_friends']))
-        return recommendations
-    
-    def get_network_data(self):
-        """Get network data for visualization"""
-        nodes = []
-        edges = []
-        
-        for node in self.graph.nodes():
-            nodes.append({
-                'id': node,
-                'label': self.users[node],
-                'name': self.users[node]
-            })
-        
-        for edge in self.graph.edges():
-            edges.append({
-                'from': edge[0],
-                'to': edge[1]
-            })
-        
-        return {'nodes': nodes, 'edges': edges}
-    
-    def get_database_stats(self):
-        """Get database statistics"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT COUNT(*) FROM users')
-        user_count = cursor.fetchone()[0]
-        
-        cursor.execute('SELECT COUNT(*) FROM friendships')
-        friendship_count = cursor.fetchone()[0]
-        
-        conn.close()
-        
-        return {
-            'users_in_db': user_count,
-            'friendships_in_db': friendship_count,
-            'users_in_memory': len(self.users),
-            'friendships_in_memory': len(self.graph.edges())
-        }
+app = Flask(__name__)
+CORS(app, expose_headers=['X-Next-Cursor'])
 
 # Initialize database-backed social network
-social_network_db = SocialNetworkDB()
+social_network_db = SocialNetworkDB(
+    graph_backend=os.environ.get('GRAPH_BACKEND', 'csr'),
+    mutual_index_size=int(os.environ.get('MUTUAL_INDEX_SIZE', 0)),
+    group_commit_interval=float(os.environ.get('GROUP_COMMIT_INTERVAL', 0)),
+    snapshot_path=os.environ.get('GRAPH_SNAPSHOT', 'social_network.snapshot'),
+    sync_interval=float(os.environ['SYNC_INTERVAL']) if os.environ.get('SYNC_INTERVAL') else None
+)
+
+# Pagination defaults for /api/recommendations
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 500
+
+# Search limit for /api/separation
+MAX_SEPARATION_DEPTH = 6
+
+# Items serialized per chunk when streaming /api/network
+STREAM_CHUNK_SIZE = 1000
+
+# --- Request metrics --- #
+def _route_label():
+    # The URL rule, not the path, so /api/user/1 and /api/user/2 share a series
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.route_label = _route_label()
+    REQUESTS_IN_PROGRESS.inc(method=request.method, route=g.route_label)
+
+@app.after_request
+def record_request_latency(response):
+    # Streamed bodies are still being produced here; this is the time to the first byte
+    REQUEST_SECONDS.observe(time.perf_counter() - g.request_start,
+                            method=request.method, route=g.route_label, status=response.status_code)
+    return response
+
+@app.teardown_request
+def finish_request(error=None):
+    if 'route_label' in g:
+        REQUESTS_IN_PROGRESS.dec(method=request.method, route=g.route_label)
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+@app.route('/debug/profile', methods=['GET'])
+def get_profile():
+    if not PROFILER_ENABLED:
+        return jsonify({'error': 'Profiler is disabled, set ENABLE_PROFILER=1'}), 404
+    seconds = min(request.args.get('seconds', 10, type=float), MAX_PROFILE_SECONDS)
+    stacks = PROFILER.profile(seconds)
+    if stacks is None:
+        return jsonify({'error': 'A profile is already running'}), 409
+    return Response(stacks, mimetype='text/plain')
+
+@app.before_request
+def catch_up_with_other_workers():
+    # No-op unless SYNC_INTERVAL is set (multi-worker deployments, see wsgi.py)
+    social_network_db.sync_from_db()
 
 # API Routes
 @app.route('/api/users', methods=['GET'])
 def get_users():
-    users = [{'id': uid, 'name': name} for uid, name in social_network_db.users.items()]
+    users = [{'id': uid, 'name': name} for uid, name in social_network_db.list_users()]
     return jsonify(users)
 
 @app.route('/api/users', methods=['POST'])
@@ -300,16 +106,139 @@ def add_friendship():
     else:
         return jsonify({'error': 'Friendship already exists or invalid users'}), 400
 
+@app.route('/api/friendships/bulk', methods=['POST'])
+def add_friendships_bulk():
+    """Import a streamed CSV (text/csv) or NDJSON (application/x-ndjson) edge list"""
+    fmt = format_for(request.mimetype)
+    batch_size = request.args.get('batch_size', 50000, type=int)
+    if batch_size <= 0:
+        return jsonify({'error': 'batch_size must be a positive integer'}), 400
+    
+    lines = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+    reader = EdgeReader(lines, fmt)
+    result = social_network_db.add_friendships_bulk(reader, batch_size)
+    result['invalid'] += reader.malformed
+    return jsonify(result)
+
+def encode_cursor(key):
+    """Encode a ranking key as an opaque pagination cursor"""
+    return base64.urlsafe_b64encode(':'.join(map(str, key)).encode()).decode()
+
+def decode_cursor(cursor):
+    """Decode a pagination cursor back into a ranking key, or None if malformed"""
+    try:
+        degree, neg_mutual, user_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(':')
+        return int(degree), int(neg_mutual), int(user_id)
+    except ValueError:
+        return None
+
 @app.route('/api/recommendations/<int:user_id>', methods=['GET'])
 def get_recommendations(user_id):
     degree = request.args.get('degree', 2, type=int)
-    recommendations = social_network_db.get_recommendations(user_id, degree)
-    return jsonify(recommendations)
+    limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor')
+    source = request.args.get('source', 'live')
+    
+    if source not in ('live', 'precomputed'):
+        return jsonify({'error': 'source must be live or precomputed'}), 400
+    
+    paged = limit is not None or cursor is not None
+    if limit is None and cursor is not None:
+        limit = DEFAULT_PAGE_SIZE
+    if limit is not None and limit <= 0:
+        return jsonify({'error': 'limit must be a positive integer'}), 400
+    if limit is not None:
+        limit = min(limit, MAX_PAGE_SIZE)
+    
+    after = None
+    if cursor is not None:
+        after = decode_cursor(cursor)
+        if after is None:
+            return jsonify({'error': 'Invalid cursor'}), 400
+    
+    result = None
+    if source == 'precomputed':
+        # Users the offline job has not covered yet fall back to live ranking
+        result = social_network_db.get_precomputed_recommendations(user_id, degree, limit, after)
+    if result is None and not paged:
+        recommendations = social_network_db.get_recommendations(user_id, degree)
+        with stage('json_encode'):
+            return jsonify(recommendations)
+    if result is None:
+        result = social_network_db.get_recommendation_page(user_id, degree, limit, after)
+    
+    recommendations, next_key = result
+    with stage('json_encode'):
+        response = jsonify(recommendations)
+    if next_key is not None:
+        response.headers['X-Next-Cursor'] = encode_cursor(next_key)
+    return response
+
+def _chunks(items, size=STREAM_CHUNK_SIZE):
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+def stream_network_json(nodes, edges):
+    """Stream {"nodes": [...], "edges": [...]} one chunk of items at a time"""
+    for key, items, opening in (('nodes', nodes, '{'), ('edges', edges, ', ')):
+        yield f'{opening}"{key}": ['
+        separator = ''
+        for chunk in _chunks(items):
+            yield separator + ', '.join(json.dumps(item) for item in chunk)
+            separator = ', '
+        yield ']'
+    yield '}'
+
+def stream_network_ndjson(nodes, edges):
+    """Stream one JSON object per line, tagged with its type"""
+    for kind, items in (('node', nodes), ('edge', edges)):
+        for chunk in _chunks(items):
+            yield ''.join(json.dumps({'type': kind, **item}) + '\n' for item in chunk)
+
+@app.route('/api/separation/<int:user1_id>/<int:user2_id>', methods=['GET'])
+def get_degree_of_separation(user1_id, user2_id):
+    if user1_id not in social_network_db.users or user2_id not in social_network_db.users:
+        return jsonify({'error': 'User not found'}), 404
+    
+    max_depth = request.args.get('max_depth', MAX_SEPARATION_DEPTH, type=int)
+    degree = social_network_db.get_degree_of_separation(user1_id, user2_id, max_depth)
+    return jsonify({
+        'user1_id': user1_id,
+        'user2_id': user2_id,
+        'degree': degree,
+        'max_depth': max_depth
+    })
 
 @app.route('/api/network', methods=['GET'])
 def get_network():
-    network_data = social_network_db.get_network_data()
-    return jsonify(network_data)
+    """Stream the network, optionally limited to an ego network, a degree filter or a sample"""
+    ego = request.args.get('ego', type=int)
+    hops = request.args.get('hops', 1, type=int)
+    min_degree = request.args.get('min_degree', type=int)
+    sample = request.args.get('sample', type=int)
+    seed = request.args.get('seed', type=int)
+    fmt = request.args.get('format', 'json')
+    
+    if fmt not in ('json', 'ndjson'):
+        return jsonify({'error': 'format must be json or ndjson'}), 400
+    if ego is not None and ego not in social_network_db.users:
+        return jsonify({'error': 'User not found'}), 404
+    if hops < 0 or (sample is not None and sample < 0):
+        return jsonify({'error': 'hops and sample must not be negative'}), 400
+    
+    selected = social_network_db.select_network_nodes(ego, hops, min_degree, sample, seed)
+    nodes = social_network_db.iter_network_nodes(selected)
+    edges = social_network_db.iter_network_edges(selected)
+    
+    if fmt == 'ndjson':
+        return Response(stream_with_context(stream_network_ndjson(nodes, edges)),
+                        mimetype='application/x-ndjson')
+    return Response(stream_with_context(stream_network_json(nodes, edges)),
+                    mimetype='application/json')
 
 @app.route('/api/database/stats', methods=['GET'])
 def get_database_stats():
@@ -328,4 +257,5 @@ def get_user(user_id):
 if __name__ == '__main__':
     print("🚀 Starting Social Network API with SQLite Database...")
     print("💾 Database file: social_network.db")
-    app.run(host='172.21.160.167', port=9000, debug=True)
\ No newline at end of file
+    app.run(host='172.21.160.167', port=9000, threaded=True,
+            debug=os.environ.get('FLASK_DEBUG') == '1')
\ No newline at end of file
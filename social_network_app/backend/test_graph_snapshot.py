@@ -0,0 +1,77 @@
+import random
+
+import pytest
+
+from graph_snapshot import SnapshotError, build_snapshot, read_snapshot
+from graph_store import CSRGraph
+from social_db import SocialNetworkDB
+
+
+def edge_set(edges):
+    return sorted(tuple(sorted(edge)) for edge in edges)
+
+
+def add_random_friendships(db, rng, count):
+    users = list(db.users)
+    for _ in range(count):
+        db.add_friendship(*rng.sample(users, 2))
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'social.db')
+    db = SocialNetworkDB(path)
+    rng = random.Random(0)
+    for i in range(40):
+        db.add_user(f'user {i} ✓')
+    add_random_friendships(db, rng, 120)
+    db.pool.close_all()
+    return path
+
+
+def test_snapshot_round_trip(db_path, tmp_path):
+    snapshot_path = str(tmp_path / 'social.snapshot')
+    db = SocialNetworkDB(db_path, graph_backend='networkx')
+    num_users, num_edges, max_friendship_id = build_snapshot(db_path, snapshot_path)
+    assert (num_users, num_edges, max_friendship_id) == (len(db.users), db.graph.number_of_edges(),
+                                                         db.last_friendship_id)
+
+    snapshot = read_snapshot(snapshot_path)
+    assert snapshot['users'] == db.users
+    assert snapshot['max_user_id'] == db.last_user_id
+    assert snapshot['max_friendship_id'] == db.last_friendship_id
+    graph = CSRGraph.from_arrays(snapshot['user_ids'], snapshot['offsets'], snapshot['targets'])
+    assert sorted(graph.nodes()) == sorted(db.graph.nodes())
+    assert edge_set(graph.edges()) == edge_set(db.graph.edges())
+    for user in db.users:
+        assert sorted(graph.neighbors(user)) == sorted(db.graph.neighbors(user))
+
+
+@pytest.mark.parametrize('backend', ['csr', 'networkx'])
+def test_snapshot_plus_replayed_rows_matches_database(db_path, tmp_path, backend):
+    snapshot_path = str(tmp_path / 'social.snapshot')
+    build_snapshot(db_path, snapshot_path)
+
+    # Rows written after the snapshot must be replayed on top of it
+    writer = SocialNetworkDB(db_path)
+    late_user = writer.add_user('late user')
+    writer.add_friendship(late_user, 1)
+    add_random_friendships(writer, random.Random(1), 30)
+    writer.pool.close_all()
+
+    from_db = SocialNetworkDB(db_path, graph_backend='networkx')
+    from_snapshot = SocialNetworkDB(db_path, graph_backend=backend, snapshot_path=snapshot_path)
+    assert from_snapshot.users == from_db.users
+    assert (from_snapshot.last_user_id, from_snapshot.last_friendship_id) == \
+        (from_db.last_user_id, from_db.last_friendship_id)
+    assert edge_set(from_snapshot.graph.edges()) == edge_set(from_db.graph.edges())
+    for user in from_db.users:
+        assert from_snapshot.get_recommendations(user, 3) == from_db.get_recommendations(user, 3)
+
+
+def test_truncated_snapshot_is_rejected(db_path, tmp_path):
+    snapshot_path = tmp_path / 'social.snapshot'
+    build_snapshot(db_path, str(snapshot_path))
+    snapshot_path.write_bytes(snapshot_path.read_bytes()[:20])
+    with pytest.raises(SnapshotError):
+        read_snapshot(str(snapshot_path))
@@ -0,0 +1,84 @@
+import random
+
+import networkx as nx
+import pytest
+
+from graph_store import CSRGraph, mutual_friend_counts
+
+
+def edge_set(edges):
+    return sorted(tuple(sorted(edge)) for edge in edges)
+
+
+def assert_same_graph(graph, expected):
+    assert sorted(graph.nodes()) == sorted(expected.nodes())
+    assert graph.number_of_edges() == expected.number_of_edges()
+    assert edge_set(graph.edges()) == edge_set(expected.edges())
+    for node in expected.nodes():
+        assert sorted(graph.neighbors(node)) == sorted(expected.neighbors(node)), f"neighbors of {node}"
+        assert graph.degree(node) == expected.degree(node), f"degree of {node}"
+        assert mutual_friend_counts(graph, node) == mutual_friend_counts(expected, node), f"2-hop of {node}"
+
+
+def random_operations(graph, expected, rng, users, steps):
+    """Apply the same random mix of single edges, bulk loads and merges to both graphs"""
+    for _ in range(steps):
+        op = rng.random()
+        if op < 0.6:
+            u, v = rng.choice(users), rng.choice(users)  # self loops and repeats included
+            graph.add_edge(u, v)
+            if u != v:
+                expected.add_edge(u, v)
+        elif op < 0.85:
+            edges = [(rng.choice(users), rng.choice(users)) for _ in range(rng.randint(0, 30))]
+            graph.add_edges_from(edges)
+            expected.add_edges_from((u, v) for u, v in edges if u != v)
+        elif op < 0.95:
+            graph.merge()
+        else:
+            node = rng.choice(users) + 1000  # isolated node
+            graph.add_node(node)
+            expected.add_node(node)
+
+        u, v = rng.choice(users), rng.choice(users)
+        assert graph.has_edge(u, v) == expected.has_edge(u, v), f"has_edge({u}, {v})"
+
+
+@pytest.mark.parametrize('merge_threshold', [1, 7, 65536])
+@pytest.mark.parametrize('seed', range(6))
+def test_csr_graph_matches_networkx(merge_threshold, seed):
+    rng = random.Random(seed)
+    users = rng.sample(range(1, 10000), 80)  # sparse, unordered ids
+    graph = CSRGraph(merge_threshold=merge_threshold)
+    expected = nx.Graph()
+
+    random_operations(graph, expected, rng, users, 300)
+    assert_same_graph(graph, expected)
+    graph.merge()
+    assert_same_graph(graph, expected)
+
+
+def test_edges_iteration_is_not_torn_by_a_merge():
+    graph = CSRGraph()
+    graph.add_edges_from([(1, 2), (2, 3)])
+    graph.add_edge(3, 4)
+    edges = graph.edges()
+    first = next(edges)
+    graph.add_edge(4, 5)
+    graph.merge()
+    assert edge_set([first, *edges]) == [(1, 2), (2, 3), (3, 4)]
+
+
+def test_from_arrays_round_trip():
+    rng = random.Random(0)
+    users = list(range(1, 41))
+    graph, expected = CSRGraph(), nx.Graph()
+    random_operations(graph, expected, rng, users, 100)
+
+    ids, offsets, targets = graph.to_arrays()
+    restored = CSRGraph.from_arrays(ids.copy(), offsets.copy(), targets.copy())
+    assert_same_graph(restored, expected)
+
+    # The restored graph keeps accepting edges on top of the adopted arrays
+    random_operations(restored, expected, rng, users, 100)
+    assert_same_graph(restored, expected)
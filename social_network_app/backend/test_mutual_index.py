@@ -0,0 +1,61 @@
+import random
+
+import pytest
+
+from graph_store import create_graph, mutual_friend_counts
+from mutual_index import MutualFriendIndex
+
+
+def expected_row(graph, user, cap):
+    """Top ``cap`` candidates by (count, lowest id), computed from scratch"""
+    counts = mutual_friend_counts(graph, user)
+    ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+    return dict(ranked[:cap])
+
+
+def assert_matches_exact(index, graph, cap):
+    for user in graph.nodes():
+        assert index.candidates(user) == expected_row(graph, user, cap), f"row of user {user}"
+
+
+@pytest.mark.parametrize('backend', ['csr', 'networkx'])
+@pytest.mark.parametrize('cap', [1, 3, 5, 200])
+@pytest.mark.parametrize('seed', range(5))
+def test_incremental_rows_match_exact_counts(backend, cap, seed):
+    rng = random.Random(seed)
+    users = list(range(1, 61))
+    graph = create_graph(backend)
+    graph.add_nodes_from(users)
+
+    # Start from a partial graph so build() and add_edge() are both exercised
+    edges = set()
+    while len(edges) < 120:
+        u, v = rng.sample(users, 2)
+        edges.add((min(u, v), max(u, v)))
+    edges = list(edges)
+    graph.add_edges_from(edges[:40])
+    index = MutualFriendIndex(graph, max_candidates=cap)
+    index.build()
+    assert_matches_exact(index, graph, cap)
+
+    for step, (u, v) in enumerate(edges[40:]):
+        graph.add_edge(u, v)
+        index.add_edge(u, v)
+        # Check only some of the time so rows take several updates between reads
+        if step % 7 == 0:
+            assert_matches_exact(index, graph, cap)
+    assert_matches_exact(index, graph, cap)
+
+
+def test_new_friend_frees_slot_for_dropped_candidate():
+    # User 1 reaches 10 through three friends and 11 and 12 through one each
+    graph = create_graph('networkx')
+    graph.add_edges_from([(1, 2), (1, 3), (1, 4), (2, 10), (3, 10), (4, 10), (2, 11), (3, 12)])
+    index = MutualFriendIndex(graph, max_candidates=2)
+    index.build()
+    assert index.candidates(1) == {10: 3, 11: 1}
+
+    # 10 becomes a direct friend; 12 was dropped earlier and must come back
+    graph.add_edge(1, 10)
+    index.add_edge(1, 10)
+    assert index.candidates(1) == expected_row(graph, 1, 2)
@@ -0,0 +1,158 @@
+"""Level-synchronous graph traversals.
+
+Every traversal expands a whole frontier at a time. On a CSRGraph the
+frontier, the visited set and the neighbor gathering are NumPy arrays over
+dense rows; any other graph (networkx) falls back to Python sets.
+"""
+import numpy as np
+
+from graph_store import CSRGraph
+
+# Sources handled per multi-source pass: one bit of a uint64 per source
+BATCH_WIDTH = 64
+
+
+def bfs_levels(graph, sources, max_depth):
+    """Yield (depth, [nodes]) for each BFS level around ``sources``, starting at depth 0"""
+    sources = [source for source in sources if source in graph]
+    if not sources:
+        return
+
+    if not isinstance(graph, CSRGraph):
+        visited = set(sources)
+        frontier = list(dict.fromkeys(sources))
+        for depth in range(max_depth + 1):
+            if not frontier:
+                return
+            yield depth, frontier
+            if depth == max_depth:
+                return
+            next_frontier = []
+            for node in frontier:
+                for neighbor in graph.neighbors(node):
+                    if neighbor not in visited:
+                        visited.add(neighbor)
+                        next_frontier.append(neighbor)
+            frontier = next_frontier
+        return
+
+    visited = np.zeros(len(graph), dtype=bool)
+    frontier = np.unique(np.fromiter((graph.row_of(source) for source in sources), dtype=np.int32))
+    visited[frontier] = True
+    for depth in range(max_depth + 1):
+        if not len(frontier):
+            return
+        yield depth, graph.ids_of(frontier).tolist()
+        if depth == max_depth:
+            return
+        reached = np.unique(graph.neighbor_rows_many(frontier))
+        frontier = reached[~visited[reached]]
+        visited[frontier] = True
+
+
+def hop_distances(graph, sources, max_depth):
+    """Distance from the nearest source for every node within ``max_depth`` hops"""
+    return {node: depth for depth, nodes in bfs_levels(graph, sources, max_depth) for node in nodes}
+
+
+def multi_source_bfs(graph, sources, max_depth):
+    """Yield (source, [(node, depth), ...]) for many sources, sharing passes over the graph.
+
+    On a CSRGraph up to BATCH_WIDTH sources are traversed together: each row
+    carries a uint64 whose bit i says "reached from source i", so one
+    frontier expansion advances every BFS in the batch at once. Depth-0
+    entries (the sources themselves) are not reported.
+    """
+    sources = [source for source in sources if source in graph]
+    if not isinstance(graph, CSRGraph):
+        for source in sources:
+            yield source, [(node, depth) for depth, nodes in bfs_levels(graph, (source,), max_depth)
+                           if depth > 0 for node in nodes]
+        return
+
+    for start in range(0, len(sources), BATCH_WIDTH):
+        yield from _multi_source_bfs_csr(graph, sources[start:start + BATCH_WIDTH], max_depth)
+
+
+def _multi_source_bfs_csr(graph, batch, max_depth):
+    n = len(graph)
+    rows = np.fromiter((graph.row_of(source) for source in batch), dtype=np.int32, count=len(batch))
+    bits = np.left_shift(np.uint64(1), np.arange(len(batch), dtype=np.uint64))
+
+    seen = np.zeros(n, dtype=np.uint64)
+    np.bitwise_or.at(seen, rows, bits)
+    frontier = seen.copy()
+    results = [[] for _ in batch]
+
+    for depth in range(1, max_depth + 1):
+        active = np.flatnonzero(frontier).astype(np.int32)
+        if not len(active):
+            break
+        edge_sources, edge_targets = graph.neighbor_pairs(active)
+        reached = np.zeros(n, dtype=np.uint64)
+        np.bitwise_or.at(reached, edge_targets, frontier[edge_sources])
+        reached &= ~seen
+        seen |= reached
+        frontier = reached
+
+        hit = np.flatnonzero(reached)
+        masks = reached[hit]
+        for i, bit in enumerate(bits):
+            nodes = graph.ids_of(hit[(masks & bit) != 0]).tolist()
+            results[i].extend((node, depth) for node in nodes)
+
+    yield from zip(batch, results)
+
+
+def bidirectional_distance(graph, source, target, max_depth=None):
+    """Hop distance between ``source`` and ``target``, or None if farther than ``max_depth``.
+
+    Both searches grow one level at a time, always expanding the smaller
+    frontier, so the cost is roughly the square root of a one-sided BFS.
+    """
+    if source not in graph or target not in graph:
+        return None
+    if source == target:
+        return 0
+
+    csr = isinstance(graph, CSRGraph)
+    if csr:
+        sides = [
+            {'frontier': np.array([graph.row_of(source)], dtype=np.int32), 'depth': 0,
+             'seen': np.zeros(len(graph), dtype=bool)},
+            {'frontier': np.array([graph.row_of(target)], dtype=np.int32), 'depth': 0,
+             'seen': np.zeros(len(graph), dtype=bool)},
+        ]
+        for side in sides:
+            side['seen'][side['frontier']] = True
+    else:
+        sides = [
+            {'frontier': {source}, 'depth': 0, 'seen': {source}},
+            {'frontier': {target}, 'depth': 0, 'seen': {target}},
+        ]
+
+    while len(sides[0]['frontier']) and len(sides[1]['frontier']):
+        if max_depth is not None and sides[0]['depth'] + sides[1]['depth'] >= max_depth:
+            return None
+        side, other = sorted(sides, key=lambda s: len(s['frontier']))
+
+        if csr:
+            reached = np.unique(graph.neighbor_rows_many(side['frontier']))
+            if other['seen'][reached].any():
+                return side['depth'] + other['depth'] + 1
+            frontier = reached[~side['seen'][reached]]
+            side['seen'][frontier] = True
+        else:
+            frontier = set()
+            for node in side['frontier']:
+                for neighbor in graph.neighbors(node):
+                    if neighbor in other['seen']:
+                        return side['depth'] + other['depth'] + 1
+                    if neighbor not in side['seen']:
+                        side['seen'].add(neighbor)
+                        frontier.add(neighbor)
+
+        side['frontier'] = frontier
+        side['depth'] += 1
+
+    return None
@@ -0,0 +1,69 @@
+import queue
+import threading
+import time
+
+
+class GroupCommitQueue:
+    """Write-behind queue that coalesces single friendship inserts into periodic commits.
+
+    Callers enqueue rows and return immediately; a background thread drains
+    the queue every ``interval`` seconds (or once ``max_batch`` rows are
+    waiting) and writes the whole batch with one executemany and one commit.
+    """
+
+    INSERT_SQL = 'INSERT OR IGNORE INTO friendships (user1_id, user2_id) VALUES (?, ?)'
+
+    def __init__(self, pool, interval=0.05, max_batch=5000):
+        self.pool = pool
+        self.interval = interval
+        self.max_batch = max_batch
+        self.commits = 0
+        self.rows_written = 0
+        self._queue = queue.Queue()
+        self._closed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='group-commit', daemon=True)
+        self._thread.start()
+
+    def submit(self, user1_id, user2_id):
+        self._queue.put((user1_id, user2_id))
+
+    def flush(self):
+        """Block until every submitted row has been committed"""
+        self._queue.join()
+
+    def close(self):
+        self.flush()
+        self._closed.set()
+        self._thread.join()
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def _run(self):
+        while not self._closed.is_set():
+            try:
+                first = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+            batch = [first]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                with self.pool.transaction() as cursor:
+                    cursor.executemany(self.INSERT_SQL, batch)
+                self.commits += 1
+                self.rows_written += len(batch)
+            except Exception as e:
+                print(f"❌ Group commit of {len(batch)} friendships failed: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
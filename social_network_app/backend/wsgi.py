@@ -0,0 +1,18 @@
+"""WSGI entry point for multi-worker serving.
+
+    gunicorn --workers 4 --threads 8 --bind 0.0.0.0:9000 wsgi:app
+
+Every worker process holds its own copy of the graph (start it from a
+snapshot, see graph_snapshot.py, to keep startup fast). Writes go to the
+shared SQLite database; before handling a request each worker replays the
+users and friendships committed by the others, at most once every
+SYNC_INTERVAL seconds (1 by default). Within a worker, reads share a
+read-write lock with the threads applying updates.
+"""
+import os
+
+os.environ.setdefault('SYNC_INTERVAL', '1')
+
+from social_network_api import app  # noqa: E402
+
+__all__ = ['app']